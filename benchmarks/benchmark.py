@@ -0,0 +1,311 @@
+# vsquickview
+# Copyright (c) Akatsumekusa and contributors
+
+# ---------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ---------------------------------------------------------------------
+
+# Headless benchmark of vsquickview's frame loading. Synthetic clips are
+# previewed in an offscreen window, and the backend is driven the same
+# way the GUI does it, waiting for every frame to be displayed before
+# moving on. vsquickview options such as VSQV_CACHE_MB can be set in the
+# environment as usual to compare them.
+#
+#     python benchmarks/benchmark.py
+#     python benchmarks/benchmark.py --width 3840 --height 2160 --format YUV420P10
+#     VSQV_FORCE_8_BIT=1 python benchmarks/benchmark.py --json result.json
+#
+# Colour conversion is benchmarked with --color-space-in and --color-space,
+# for example for a calibrated SDR display or for BT.2020 content on a
+# Display P3 display, and compared with QImage.convertToColorSpace() by
+# adding --qt-color-conversion:
+#
+#     python benchmarks/benchmark.py --format RGB24 --color-space display.icc
+#     python benchmarks/benchmark.py --format RGB48 --color-space-in Bt2020 --color-space DisplayP3 --qt-color-conversion
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PySide6.QtCore import QEventLoop, QObject, QTimer, Slot
+from PySide6.QtGui import QColorSpace
+import vapoursynth as vs
+from vapoursynth import core
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import vsquickview as vsqv
+from vsquickview import vsquickview as module
+
+def peakRss():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+# A QColorSpace.NamedColorSpace such as SRgb or DisplayP3, or the path to
+# an ICC profile. Returns None if it isn't valid.
+def colorSpace(value):
+    if hasattr(QColorSpace.NamedColorSpace, value):
+        return QColorSpace(getattr(QColorSpace.NamedColorSpace, value))
+    try:
+        with open(value, "rb") as f:
+            color_space = QColorSpace.fromIccProfile(f.read())
+    except OSError:
+        return None
+    return color_space if color_space.isValid() else None
+
+def makeClip(args, index):
+    format = getattr(vs, args.format)
+    clip = core.std.BlankClip(width=args.width, height=args.height, format=format, length=args.length,
+                              color=[(index * 37 + plane * 11) % 64 for plane in range(core.get_video_format(format).num_planes)])
+    # Stands in for a filter chain, so that VapourSynth does some work for
+    # every frame
+    for _ in range(args.blur):
+        clip = clip.std.BoxBlur(hradius=2, vradius=2)
+    return clip
+
+# imageReady is emitted from vsquickview's threads, and is queued to the
+# main thread by connecting it to a QObject living there
+class DisplayWaiter(QObject):
+    def __init__(self):
+        super().__init__()
+
+        self.loop = QEventLoop()
+        self.displayed = None
+        module.backend.imageReady.connect(self.onImageReady)
+
+    @Slot(int, int, int, int, int)
+    def onImageReady(self, *_):
+        if self.displayed is None:
+            self.displayed = time.perf_counter()
+        self.loop.quit()
+
+    # Runs step() and waits until the frame it requests is displayed,
+    # returning the wall time in seconds, or None if it times out
+    def wait(self, step, timeout):
+        self.displayed = None
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(self.loop.quit)
+        timer.start(int(timeout * 1000))
+
+        start = time.perf_counter()
+        step()
+        self.loop.exec()
+        timer.stop()
+
+        return self.displayed - start if self.displayed is not None else None
+
+def settle(seconds):
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    loop.exec()
+
+# Imports vsquickview in a fresh interpreter, which starts the
+# QGuiApplication and loads the QML, and prints the wall time of the import
+# together with vsqv.Stats()["startup_ms"]. It's run from a file, since
+# vsquickview only starts for scripts and notebooks.
+ImportScript = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import vsquickview as vsqv
+wall_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{ "wall_ms": wall_ms, "startup_ms": vsqv.Stats()["startup_ms"] }}), flush=True)
+os._exit(0)
+"""
+
+def runImportScenario(args):
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, "import_vsquickview.py")
+        with open(script, "w") as f:
+            f.write(ImportScript.format(root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        for _ in range(args.import_runs):
+            output = subprocess.run([sys.executable, script], stdout=subprocess.PIPE, text=True, timeout=args.timeout * 6, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    phases = sorted({ phase for run in runs for phase in run["startup_ms"] })
+    return { "scenario": "import",
+             "runs": len(runs),
+             "wall_ms": float(np.median([run["wall_ms"] for run in runs])),
+             "startup_ms": { phase: float(np.median([run["startup_ms"][phase] for run in runs if phase in run["startup_ms"]]))
+                             for phase in phases } }
+
+def runScenario(name, steps, args, waiter):
+    latencies = []
+    timeouts = 0
+    start = time.perf_counter()
+    for step in steps:
+        latency = waiter.wait(step, args.timeout)
+        if latency is None:
+            timeouts += 1
+        else:
+            latencies.append(latency)
+        if args.interval:
+            settle(args.interval)
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return { "scenario": name,
+             "frames": len(steps),
+             "timeouts": timeouts,
+             "fps": len(latencies) / elapsed if elapsed else 0.0,
+             "p50_ms": float(np.percentile(latencies, 50)) if latencies.size else None,
+             "p99_ms": float(np.percentile(latencies, 99)) if latencies.size else None,
+             "max_ms": float(np.max(latencies)) if latencies.size else None,
+             "peak_rss_mb": peakRss() }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vsquickview's frame loading with synthetic clips.")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--format", default="YUV420P8", help="Name of a vs.PresetVideoFormat such as YUV420P10, RGB48 or GRAY16")
+    parser.add_argument("--length", type=int, default=10000)
+    parser.add_argument("--clips", type=int, default=3, help="Number of indices to populate")
+    parser.add_argument("--conversion", default="accurate", choices=["accurate", "fast"], help="See vsqv.View()")
+    parser.add_argument("--depth", default=None, choices=["8", "16", "auto"], help="See vsqv.View()")
+    parser.add_argument("--color-space-in", default="SRgb", help="Name of a QColorSpace.NamedColorSpace such as SRgb or Bt2020, or the path to an ICC profile. See vsqv.View()")
+    parser.add_argument("--color-space", default="SRgb", help="Same as --color-space-in")
+    parser.add_argument("--qt-color-conversion", action="store_true", help="Always convert colours with QImage.convertToColorSpace() instead of in VapourSynth")
+    parser.add_argument("--blur", type=int, default=0, help="Number of BoxBlur filters added to every clip")
+    parser.add_argument("--frames", type=int, default=200, help="Number of frames to display in every scenario")
+    parser.add_argument("--interval", type=float, default=0.0, help="Seconds to wait between steps, like a user holding down a key")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--import-runs", type=int, default=3, help="Number of times to import vsquickview in a new process for the import scenario, 0 to skip it")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    assert 1 <= args.clips <= 10
+    # Stepping through the clip once frame by frame and once 12 frames at a
+    # time, and then a frame for cycling through the clips, each starting
+    # past where the previous scenario may have prefetched
+    needed = 13 * args.frames + 4
+    if args.length < needed:
+        parser.error(f"--length must be at least {needed} for --frames {args.frames}")
+    gap = min(1000, (args.length - needed) // 2)
+    if (color_space_in := colorSpace(args.color_space_in)) is None:
+        parser.error(f"--color-space-in \"{args.color_space_in}\" is neither a named colour space nor a valid ICC profile")
+    if (color_space := colorSpace(args.color_space)) is None:
+        parser.error(f"--color-space \"{args.color_space}\" is neither a named colour space nor a valid ICC profile")
+
+    # Before anything else runs in this process, so that the imports
+    # don't compete with vsquickview's threads
+    import_result = runImportScenario(args) if args.import_runs > 0 else None
+
+    if args.qt_color_conversion:
+        module.colorTransform = lambda clip, color_space_in, color_space: None
+    for index in range(args.clips):
+        vsqv.View(makeClip(args, index), index, "Synthetic " + str(index), color_space_in=color_space_in, color_space=color_space,
+                  conversion=args.conversion, depth=int(args.depth) if args.depth in ["8", "16"] else args.depth)
+    backend = module.backend
+    waiter = DisplayWaiter()
+    settle(0.5)
+
+    results = []
+    frame = 1
+
+    # Stepping through the clip with Right
+    backend.switchIndex(0)
+    waiter.wait(lambda: backend.switchFrame(frame), args.timeout)
+    results.append(runScenario("next_frame", [backend.nextFrame] * args.frames, args, waiter))
+    frame += args.frames + 1 + gap
+
+    # Jumping 12 frames with Shift and Right
+    waiter.wait(lambda: backend.switchFrame(frame), args.timeout)
+    results.append(runScenario("next_twelve_frames", [backend.nextTwelveFrames] * args.frames, args, waiter))
+    frame += args.frames * 12 + 1 + gap
+
+    # Comparing clips with Space, which needs a second clip to switch to
+    if args.clips > 1:
+        waiter.wait(lambda: backend.switchFrame(frame), args.timeout)
+        results.append(runScenario("cycle_index", [backend.cycleIndex] * args.frames, args, waiter))
+
+    # Up to args.frames steps between preview group frames, fewer if the
+    # clip is too short or if the frames of all clips wouldn't fit in half
+    # of the cache, leaving the rest for prefetched frames, so that the
+    # second run is actually cached. The size of a cached frame is taken
+    # from the frames loaded so far.
+    cache = vsqv.Stats()["cache"]
+    frame_mb = cache["used_mb"] / cache["frames"] if cache["frames"] else 0.0
+    count = min(args.frames + 1, -(-args.length // 24))
+    if frame_mb:
+        count = min(count, int(cache["size_mb"] / 2 / (args.clips * frame_mb)))
+    if count < 2:
+        print("The preview group doesn't fit in the cache, increase VSQV_CACHE_MB", file=sys.stderr)
+        count = 2
+    group = list(range(0, count * 24, 24))
+
+    # Jumping between preview group frames with Ctrl and Right
+    vsqv.SetPreviewGroup(group)
+    waiter.wait(lambda: backend.switchFrame(group[0]), args.timeout)
+    results.append(runScenario("next_preview_group_frame", [backend.nextPreviewGroupFrame] * (len(group) - 1), args, waiter))
+
+    # The same again, with every frame cached, which is only reported if
+    # the frames were actually served from the cache
+    waiter.wait(lambda: backend.switchFrame(group[0]), args.timeout)
+    cache = vsqv.Stats()["cache"]
+    result = runScenario("next_preview_group_frame_cached", [backend.nextPreviewGroupFrame] * (len(group) - 1), args, waiter)
+    hits = vsqv.Stats()["cache"]["hits"] - cache["hits"]
+    misses = vsqv.Stats()["cache"]["misses"] - cache["misses"]
+    result["cache_hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+    if result["cache_hit_rate"] > 0.0:
+        results.append(result)
+    else:
+        print("next_preview_group_frame_cached had no cache hits and isn't reported, increase VSQV_CACHE_MB", file=sys.stderr)
+
+    print("{:<34}{:>8}{:>10}{:>10}{:>10}{:>14}".format("scenario", "fps", "p50 ms", "p99 ms", "max ms", "peak RSS MiB"))
+    for result in results:
+        print("{:<34}{:>8.1f}{:>10}{:>10}{:>10}{:>14}".format(result["scenario"], result["fps"],
+                                                             *["-" if result[key] is None else format(result[key], ".1f")
+                                                               for key in ["p50_ms", "p99_ms", "max_ms", "peak_rss_mb"]]))
+        if result["timeouts"]:
+            print("    " + str(result["timeouts"]) + " frames timed out")
+    if import_result is not None:
+        print("import {:.1f} ms, median of {} runs ({})".format(import_result["wall_ms"], import_result["runs"],
+                                                               ", ".join([phase + " " + format(ms, ".1f") + " ms"
+                                                                          for phase, ms in import_result["startup_ms"].items()])))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({ "arguments": vars(args),
+                        "options": { key: value for key, value in os.environ.items() if key.startswith("VSQV_") },
+                        "results": results,
+                        "import": import_result,
+                        "stats": vsqv.Stats() }, f, indent=2)
+
+    # vsquickview's threads are still running and the QGuiApplication is
+    # never exec()ed, so skip the interpreter teardown
+    sys.stdout.flush()
+    os._exit(0)
+
+if __name__ == "__main__":
+    main()
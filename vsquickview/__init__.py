@@ -40,25 +40,43 @@ if "get_ipython" in main:
 # VSPipe as of R65 (undocumented / probably not intended?).
 if "__main__" in main or "get_ipython" in main or "__file__" in main:
     from .vsquickview import View, \
+                             ViewScript, \
                              RemoveView, \
+                             SetConversion, \
+                             SetDepth, \
                              SetFrame, \
                              SetIndex, \
                              SetPreviewGroup, \
                              ClearPreviewGroup, \
                              PreviewGroup, \
+                             WarmPreviewGroup, \
+                             ExportPreviewGroup, \
+                             ScanDifferences, \
+                             DifferenceScores, \
                              Show, \
                              Hide, \
+                             Cancel, \
+                             Stats, \
                              app
 else:
     from .fakevsquickview import View, \
+                                 ViewScript, \
                                  RemoveView, \
+                                 SetConversion, \
+                                 SetDepth, \
                                  SetFrame, \
                                  SetIndex, \
                                  SetPreviewGroup, \
                                  ClearPreviewGroup, \
                                  PreviewGroup, \
+                                 WarmPreviewGroup, \
+                                 ExportPreviewGroup, \
+                                 ScanDifferences, \
+                                 DifferenceScores, \
                                  Show, \
                                  Hide, \
+                                 Cancel, \
+                                 Stats, \
                                  app
 
 __version__ = "1.1.7"
@@ -0,0 +1,151 @@
+# vsquickview
+# Copyright (c) Akatsumekusa and contributors
+
+# ---------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ---------------------------------------------------------------------
+
+import bisect
+import collections
+import mmap
+import numpy as np
+from PySide6.QtCore import QMutex
+import tempfile
+import weakref
+
+# A memory-mapped temporary file that buffers are allocated from, first
+# fit, with adjacent free ranges merged again when buffers are released.
+class MmapChunk:
+    def __init__(self, directory, size):
+        # The file is deleted as soon as it's created, and mmap keeps its
+        # own handle to it
+        with tempfile.TemporaryFile(dir=directory) as f:
+            f.truncate(size)
+            self.mmap = mmap.mmap(f.fileno(), size)
+        self.size = size
+        self.used = 0
+        # [(offset, size)], sorted by offset
+        self.free = [(0, size)]
+
+    def allocate(self, size):
+        for i, (offset, free_size) in enumerate(self.free):
+            if free_size >= size:
+                if free_size == size:
+                    del self.free[i]
+                else:
+                    self.free[i] = (offset + size, free_size - size)
+                self.used += size
+                return offset
+        return None
+
+    def release(self, offset, size):
+        self.used -= size
+        i = bisect.bisect(self.free, (offset, 0))
+        if i < len(self.free) and offset + size == self.free[i][0]:
+            size += self.free.pop(i)[1]
+        if i > 0 and self.free[i - 1][0] + self.free[i - 1][1] == offset:
+            i -= 1
+            offset, size = self.free[i][0], self.free[i][1] + size
+            del self.free[i]
+        self.free.insert(i, (offset, size))
+
+        # Returns the pages of the free range to the OS where supported,
+        # so that evicted frames don't keep taking up memory or disk space
+        start = -(-offset // mmap.PAGESIZE) * mmap.PAGESIZE
+        end = (offset + size) // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > start:
+            for advice in ["MADV_REMOVE", "MADV_DONTNEED"]:
+                if hasattr(mmap, advice) and hasattr(self.mmap, "madvise"):
+                    try:
+                        self.mmap.madvise(getattr(mmap, advice), start, end - start)
+                        break
+                    except OSError:
+                        pass
+
+    def close(self):
+        try:
+            self.mmap.close()
+            return True
+        except BufferError:
+            return False
+
+# Buffers for packed frames in VSQV_CACHE_MMAP_DIRECTORY. Mapping a
+# temporary file for every frame would keep a file descriptor open for
+# every cached frame and run into the OS's limit on open files, so frames
+# are carved out of chunks of chunk_size bytes instead, with one file
+# descriptor per chunk.
+class MmapArena:
+    Alignment = 64
+
+    def __init__(self, directory, chunk_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.lock = QMutex()
+        # [(chunk, offset, size)] released by the finalizers of buffers.
+        # Finalizers may run in any thread at any time, including while
+        # self.lock is held, so the ranges are only returned to their
+        # chunks in the next allocate().
+        self.released = collections.deque()
+
+    def allocate(self, shape, dtype):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        size = -(-max(count * dtype.itemsize, 1) // MmapArena.Alignment) * MmapArena.Alignment
+
+        self.lock.lock()
+        try:
+            self.collect()
+            for chunk in self.chunks:
+                if (offset := chunk.allocate(size)) is not None:
+                    break
+            else:
+                chunk = MmapChunk(self.directory, max(self.chunk_size, size))
+                self.chunks.append(chunk)
+                offset = chunk.allocate(size)
+        finally:
+            self.lock.unlock()
+
+        # Views of the array keep it alive, so the range is only released
+        # once no view of the buffer is left
+        array = np.frombuffer(chunk.mmap, dtype=dtype, count=count, offset=offset)
+        weakref.finalize(array, self.released.append, (chunk, offset, size))
+        return array.reshape(shape)
+
+    # Must be called with self.lock locked. Chunks that become empty are
+    # closed, except for one kept for the next frames.
+    def collect(self):
+        while self.released:
+            chunk, offset, size = self.released.popleft()
+            chunk.release(offset, size)
+        empty = [chunk for chunk in self.chunks if chunk.used == 0]
+        for chunk in empty[1:]:
+            if chunk.close():
+                self.chunks.remove(chunk)
+
+    def stats(self):
+        self.lock.lock()
+        stats = { "chunks": len(self.chunks),
+                  "mapped_mb": sum([chunk.size for chunk in self.chunks]) / 1024 / 1024,
+                  "used_mb": sum([chunk.used for chunk in self.chunks]) / 1024 / 1024 }
+        self.lock.unlock()
+
+        return stats
@@ -23,98 +23,86 @@
 # SOFTWARE.
 # ---------------------------------------------------------------------
 
-import vapoursynth as vs
-from vapoursynth import core
+import numpy as np
+from PySide6.QtCore import QMutex
+from PySide6.QtGui import QColorSpace, QImage
 
-pattern_1 = core.std.StackHorizontal([core.std.BlankClip(None, 240, 630, color=[414, 414, 414], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206, 630, color=[721, 721, 721], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206, 630, color=[721, 721,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206, 630, color=[ 64, 721, 721], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 204, 630, color=[ 64, 721,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206, 630, color=[721,  64, 721], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206, 630, color=[721,  64,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206, 630, color=[ 64,  64, 721], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 240, 630, color=[414, 414, 414], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)])
-pattern_2 = core.std.StackHorizontal([core.std.BlankClip(None, 240,  90, color=[ 64, 940, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206,  90, color=[721, 721, 721], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206,  90, color=[707, 717, 279], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206,  90, color=[465, 698, 716], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 204,  90, color=[441, 694, 259], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206,  90, color=[602, 250, 691], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206,  90, color=[584, 237, 148], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 206,  90, color=[201, 134, 686], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 240,  90, color=[ 64,  64, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)])
-ramp = core.std.BlankClip(None, (1 + 498 + 516), 90, format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)
-ramp_frame = ramp.get_frame(0).copy()
-for plane in range(3):
-    for x in range(ramp.width):
-        for y in range(ramp.height):
-            ramp_frame[plane][y, x] = round(ramp.width / (1 + 498 + 516) * x) + 4
-ramp = core.std.ModifyFrame(ramp, ramp, lambda n, f: ramp_frame)
-pattern_3 = core.std.StackHorizontal([core.std.BlankClip(None, 240,  90, color=[940, 940,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 221,  90, color=[  4,   4,   4], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      ramp,
-                                      core.std.BlankClip(None, 204,  90, color=[1019, 1019, 1019], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 240,  90, color=[940,  64,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)])
-vertical_stripe_ba = core.std.StackHorizontal([(vertical_stripe_b := core.std.BlankClip(None,   1, 135, color=[940, 940, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)), 
-                                               (vertical_stripe_a := core.std.BlankClip(None,   1, 135, color=[940,  64, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001))])
-vertical_stripe_ba_2 = core.std.StackHorizontal([vertical_stripe_ba  , vertical_stripe_ba  ])
-vertical_stripe_ba_3 = core.std.StackHorizontal([vertical_stripe_ba_2, vertical_stripe_ba_2])
-vertical_stripe_ba_4 = core.std.StackHorizontal([vertical_stripe_ba_3, vertical_stripe_ba_3])
-vertical_stripe_ba_5 = core.std.StackHorizontal([vertical_stripe_ba_4, vertical_stripe_ba_4])
-vertical_stripe_ba_6 = core.std.StackHorizontal([vertical_stripe_ba_5, vertical_stripe_ba_5])
-vertical_stripe = core.std.StackHorizontal([vertical_stripe_ba_6,
-                                            vertical_stripe_ba_5,
-                                            vertical_stripe_ba_2])
-block = core.std.StackVertical([core.std.BlankClip(None,  40,  68, color=[940, 502, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                core.std.BlankClip(None,  40,  67, color=[792, 502, 792], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)])
-horizontal_stripe_ba = core.std.StackVertical([(horizontal_stripe_b := core.std.BlankClip(None, 100,   1, color=[940, 940, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)),
-                                               (horizontal_stripe_a := core.std.BlankClip(None, 100,   1, color=[940,  64, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001))])
-horizontal_stripe_ba_2 = core.std.StackVertical([horizontal_stripe_ba  , horizontal_stripe_ba  ])
-horizontal_stripe_ba_3 = core.std.StackVertical([horizontal_stripe_ba_2, horizontal_stripe_ba_2])
-horizontal_stripe_ba_4 = core.std.StackVertical([horizontal_stripe_ba_3, horizontal_stripe_ba_3])
-horizontal_stripe_ba_5 = core.std.StackVertical([horizontal_stripe_ba_4, horizontal_stripe_ba_4])
-horizontal_stripe_ba_6 = core.std.StackVertical([horizontal_stripe_ba_5, horizontal_stripe_ba_5])
-horizontal_stripe_ba_7 = core.std.StackVertical([horizontal_stripe_ba_6, horizontal_stripe_ba_6])
-horizontal_stripe = core.std.StackVertical([horizontal_stripe_ba_7,
-                                            horizontal_stripe_ba_2,
-                                            horizontal_stripe_ba,
-                                            horizontal_stripe_b])
-cyclone = core.std.BlankClip(None,  10,   9, color=[940, 940, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001)
-cyclone_frame = cyclone.get_frame(0).copy()
-if True:
+# ARIB STD-B66 colour bar for 1920x1080, with 10-bit full range RGB
+# values. The pattern is described as a list of rows, each being a list
+# of (width, colour) columns. The ramp, the stripes and the cyclone are
+# filled in separately.
+Rows = [(630, [(240, [414, 414, 414]), (206, [721, 721, 721]), (206, [721, 721,  64]), (206, [ 64, 721, 721]), (204, [ 64, 721,  64]),
+               (206, [721,  64, 721]), (206, [721,  64,  64]), (206, [ 64,  64, 721]), (240, [414, 414, 414])]),
+        ( 90, [(240, [ 64, 940, 940]), (206, [721, 721, 721]), (206, [707, 717, 279]), (206, [465, 698, 716]), (204, [441, 694, 259]),
+               (206, [602, 250, 691]), (206, [584, 237, 148]), (206, [201, 134, 686]), (240, [ 64,  64, 940])]),
+        ( 90, [(240, [940, 940,  64]), (221, [  4,   4,   4]), (1015, None), (204, [1019, 1019, 1019]), (240, [940,  64,  64])]),
+        (270, [(240, [414, 414, 414]), (282, [ 64,  64,  64]), (438, [940, 940, 940]), (232, [ 64,  64,  64]), ( 68, [ 48,  48,  48]),
+               ( 70, [ 64,  64,  64]), ( 68, [ 80,  80,  80]), (282, [ 64,  64,  64]), (240, None)])]
+
+def cyclone():
+    tile = np.full((9, 10, 3), 940, dtype=np.uint16)
     x = 9
     y = 8
-    cyclone_frame[0][y, x] = 64
-    cyclone_frame[1][y, x] = 64
-    cyclone_frame[2][y, x] = 64
+    tile[y, x] = 64
     route = [[0, -1, 0, -8], [-1, 0, -8, 0], [0, 1, 0, 7], [1, 0, 6, 0], [0, -1, 0, -5], [-1, 0, -4, 0], [0, 1, 0, 3], [1, 0, 2, 0], [0, -1, 0, -1]]
     while route:
         step = route.pop(0)
         while step[2] or step[3]:
             x += step[0]
             y += step[1]
-            cyclone_frame[0][y, x] = 64
-            cyclone_frame[1][y, x] = 64
-            cyclone_frame[2][y, x] = 64
+            tile[y, x] = 64
 
             step[2] -= step[0]
             step[3] -= step[1]
-cyclone = core.std.ModifyFrame(cyclone, cyclone, lambda n, f: cyclone_frame)
-vertical_cyclone = core.std.StackVertical([cyclone] * 15)
-cyclone_pattern = core.std.StackHorizontal([vertical_cyclone] * 24)
-full_hd_pattern = core.std.StackVertical([core.std.StackHorizontal([vertical_stripe,
-                                                                    block,
-                                                                    horizontal_stripe]),
-                                          cyclone_pattern])
-pattern_4 = core.std.StackHorizontal([core.std.BlankClip(None, 240, 270, color=[414, 414, 414], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 282, 270, color=[ 64,  64,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 438, 270, color=[940, 940, 940], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 232, 270, color=[ 64,  64,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None,  68, 270, color=[ 48,  48,  48], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None,  70, 270, color=[ 64,  64,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None,  68, 270, color=[ 80,  80,  80], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      core.std.BlankClip(None, 282, 270, color=[ 64,  64,  64], format=vs.RGB30, length=1, fpsnum=24000, fpsden=1001),
-                                      full_hd_pattern])
-ColourBars = core.std.StackVertical([pattern_1, pattern_2, pattern_3, pattern_4])
-ColourBars = core.resize.Spline36(ColourBars, format=vs.RGB48)
+    return tile
+
+def fullHdPattern():
+    pattern = np.empty((270, 240, 3), dtype=np.uint16)
+    # Vertical stripes alternating between b and a every column
+    pattern[:135, :100] = [940, 940, 940]
+    pattern[:135, 1:100:2] = [940,  64, 940]
+    pattern[:68, 100:140] = [940, 502, 940]
+    pattern[68:135, 100:140] = [792, 502, 792]
+    # Horizontal stripes alternating between b and a every row
+    pattern[:135, 140:] = [940, 940, 940]
+    pattern[1:135:2, 140:] = [940,  64, 940]
+    pattern[135:] = np.tile(cyclone(), (15, 24, 1))
+    return pattern
+
+def colourBars():
+    image = np.empty((1080, 1920, 3), dtype=np.uint16)
+    y = 0
+    for height, columns in Rows:
+        x = 0
+        for width, colour in columns:
+            if colour is not None:
+                image[y:y + height, x:x + width] = colour
+            x += width
+        y += height
+
+    # Ramp from 4 to 1018
+    image[720:810, 461:1476] = (np.arange(1015, dtype=np.uint16) + 4)[np.newaxis, :, np.newaxis]
+    image[810:1080, 1680:1920] = fullHdPattern()
+
+    return image
+
+ColourBarsImage = None
+ColourBarsLock = QMutex()
+
+# The colour bar is only built the first time it is displayed, and is
+# shared afterwards.
+def ColourBars():
+    global ColourBarsImage
+
+    ColourBarsLock.lock()
+    if ColourBarsImage is None:
+        image = np.empty((1080, 1920, 4), dtype=np.uint16)
+        # 10-bit to 16-bit full range
+        image[:, :, :3] = (colourBars().astype(np.uint32) * 65535 + 511) // 1023
+        image[:, :, 3] = np.iinfo(np.uint16).max
+        ColourBarsImage = QImage(image.data, 1920, 1080, image.strides[0], QImage.Format.Format_RGBX64)
+        ColourBarsImage.setColorSpace(QColorSpace(QColorSpace.SRgb))
+    img = ColourBarsImage
+    ColourBarsLock.unlock()
+
+    return img
@@ -0,0 +1,124 @@
+# vsquickview
+# Copyright (c) Akatsumekusa and contributors
+
+# ---------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ---------------------------------------------------------------------
+
+# The conversions of clips to the formats vsquickview displays, which only
+# depend on VapourSynth so that they can also run in the render worker,
+# see worker.py.
+
+import vapoursynth as vs
+from vapoursynth import core
+
+# Tiles are cropped with TileMargin pixels of their neighbours before
+# converting to RGB, so that chroma upsampling at the edges of a tile
+# matches that of the whole frame.
+TileSize = 512
+TileMargin = 16
+
+# Converts the clip passed to vsqv.View() to a format loadImage() supports.
+# For level above 1, the clip is also downscaled by level in the same
+# resize, so that no pixels are converted at full resolution only to be
+# scaled down by Qt afterwards. Clips with variable dimensions are never
+# downscaled.
+# In "fast" conversion, chroma is upsampled using Bilinear instead of
+# Spline36, which is faster but blurrier.
+def convertClip(clip, depth, level=1, conversion="accurate"):
+    if level == 1 or clip.width == 0 or clip.height == 0:
+        resize = core.resize.Spline36 if conversion == "accurate" else core.resize.Bilinear
+        size = {}
+    else:
+        resize = core.resize.Bilinear
+        size = { "width": max(clip.width // level, 1), "height": max(clip.height // level, 1) }
+
+    if depth == 16:
+        if clip.format.color_family == vs.YUV:
+            clip = resize(clip, format=vs.RGB48, matrix_in=vs.MATRIX_BT709, matrix=vs.MATRIX_RGB, transfer_in=vs.TRANSFER_BT709, transfer=13, dither_type="none", **size)
+        elif clip.format.color_family == vs.RGB:
+            if clip.format.bits_per_sample == 8:
+                if size:
+                    clip = resize(clip, format=vs.RGB24, dither_type="none", **size)
+            elif clip.format.bits_per_sample == 16:
+                if size:
+                    clip = resize(clip, format=vs.RGB48, dither_type="none", **size)
+            else:
+                clip = resize(clip, format=vs.RGB48, dither_type="none", **size)
+        elif clip.format.color_family == vs.GRAY:
+            if clip.format.bits_per_sample == 8:
+                if size:
+                    clip = resize(clip, format=vs.GRAY8, dither_type="none", **size)
+            elif clip.format.bits_per_sample == 16:
+                if size:
+                    clip = resize(clip, format=vs.GRAY16, dither_type="none", **size)
+            else:
+                clip = resize(clip, format=vs.GRAY16, dither_type="none", **size)
+        else:
+            raise TypeError("Unsupported clip.format.color_family. vsquickview only supports vs.RGB, vs.YUV or vs.GRAY. To add support for other formats, raise an issue or make a pull request at https://github.com/Akatmks/vsquickview .")
+
+    else: # depth == 8
+        if clip.format.color_family == vs.YUV:
+            clip = resize(clip, format=vs.RGB24, matrix_in=vs.MATRIX_BT709, matrix=vs.MATRIX_RGB, transfer_in=vs.TRANSFER_BT709, transfer=13, dither_type="none", **size)
+        elif clip.format.color_family == vs.RGB:
+            clip = resize(clip, format=vs.RGB24, dither_type="none", **size)
+        elif clip.format.color_family == vs.GRAY:
+            clip = resize(clip, format=vs.GRAY8, dither_type="none", **size)
+        else:
+            raise TypeError("Unsupported clip.format.color_family. vsquickview only supports vs.RGB, vs.YUV or vs.GRAY. To add support for other formats, raise an issue or make a pull request at https://github.com/Akatmks/vsquickview .")
+
+    return clip
+
+# Applies a ColorTransform, or any object with the same matrix and luts(),
+# to a clip converted by convertClip().
+def transformClip(clip, color_transform):
+    if color_transform is None:
+        return clip
+
+    depth = clip.format.bits_per_sample
+    decode, encode = color_transform.luts(depth)
+    # Stays at 16-bit before encoding with the LUT
+    bits = 16 if encode is not None else depth
+    planes = [clip.std.ShufflePlanes(planes=plane, colorfamily=vs.GRAY) for plane in range(3)]
+    planes = [planes[plane].std.Lut(lutf=decode[:, plane].tolist(), floatout=True) for plane in range(3)]
+    # Matrix, followed by the sRGB transfer
+    planes = [core.std.Expr(planes, f"x {row[0]} * y {row[1]} * + z {row[2]} * + 0 max 1 min "
+                                    f"dup 0.0031308 <= swap dup 12.92 * swap 0.41666667 pow 1.055 * 0.055 - ? "
+                                    f"{2 ** bits - 1} *", format=vs.GRAY16 if bits == 16 else vs.GRAY8)
+              for row in color_transform.matrix]
+    if encode is not None:
+        planes = [planes[plane].std.Lut(lut=encode[:, plane].tolist(), bits=depth) for plane in range(3)]
+    return core.std.ShufflePlanes(planes, planes=[0, 0, 0], colorfamily=vs.RGB).std.CopyFrameProps(clip)
+
+# Crops the clip passed to vsqv.View() to a tile and converts it.
+def convertTile(clip, depth, tile, conversion="accurate"):
+    x = tile[0] * TileSize
+    y = tile[1] * TileSize
+    width = min(TileSize, clip.width - x)
+    height = min(TileSize, clip.height - y)
+    left = min(TileMargin, x)
+    top = min(TileMargin, y)
+    right = min(TileMargin, clip.width - x - width)
+    bottom = min(TileMargin, clip.height - y - height)
+
+    clip = clip.std.CropAbs(width=left + width + right, height=top + height + bottom, left=x - left, top=y - top)
+    clip = convertClip(clip, depth, 1, conversion)
+    return clip.std.CropAbs(width=width, height=height, left=left, top=top)
@@ -0,0 +1,176 @@
+# vsquickview
+# Copyright (c) Akatsumekusa and contributors
+
+# ---------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ---------------------------------------------------------------------
+
+import collections
+import hashlib
+import numpy as np
+import os
+from pathlib import Path
+from PySide6.QtCore import QMutex
+import tempfile
+
+# Frames are stored as raw .npy files named after the hash of their key,
+# and are read straight into buffers from allocate when loaded, without
+# keeping the files open. The least recently used files, by their
+# modification time, are deleted once the directory exceeds size bytes.
+class DiskCache:
+    def __init__(self, directory, size):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = size
+        self.bytes = 0
+        # { name: bytes }, from least to most recently used
+        self.files = collections.OrderedDict()
+        # { name: bytes } of files that couldn't be deleted, for example
+        # because another process has them open on Windows. They still
+        # count towards size and are deleted again on the next eviction.
+        self.undeleted = {}
+        self.lock = QMutex()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".npy"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.files[name] = size
+            self.bytes += size
+
+    def get(self, key, allocate=np.empty):
+        name = self.name(key)
+
+        self.lock.lock()
+        if name in self.files:
+            self.files.move_to_end(name)
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.lock.unlock()
+            return None
+        self.lock.unlock()
+
+        try:
+            with open(self.directory / name, "rb") as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                elif version == (2, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                else:
+                    raise ValueError("Unsupported .npy version " + str(version))
+                if fortran_order or dtype.hasobject:
+                    raise ValueError("Unsupported .npy layout")
+                array = allocate(shape, dtype)
+                if f.readinto(memoryview(array).cast("B")) != array.nbytes:
+                    raise ValueError("Truncated .npy file")
+            os.utime(self.directory / name)
+        except (OSError, ValueError):
+            self.remove(name)
+            return None
+
+        return array
+
+    def insert(self, key, array):
+        name = self.name(key)
+
+        # Written to a temporary file first so that other processes never
+        # see a partially written frame
+        fd, temp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(temp, self.directory / name)
+        except OSError:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            return
+
+        size = (self.directory / name).stat().st_size
+
+        self.lock.lock()
+        if name in self.files:
+            self.bytes -= self.files[name]
+        if name in self.undeleted:
+            self.bytes -= self.undeleted.pop(name)
+        self.files[name] = size
+        self.bytes += size
+        self.evict()
+        self.lock.unlock()
+
+    def remove(self, name):
+        self.lock.lock()
+        if name in self.files:
+            self.delete(name, self.files.pop(name))
+        self.lock.unlock()
+
+    def resize(self, size):
+        self.lock.lock()
+        self.size = size
+        self.evict()
+        self.lock.unlock()
+
+    # Must be called with self.lock locked
+    def evict(self):
+        for name, size in list(self.undeleted.items()):
+            del self.undeleted[name]
+            self.delete(name, size)
+        while self.bytes > self.size and self.files:
+            name, size = self.files.popitem(last=False)
+            self.evictions += 1
+            self.delete(name, size)
+
+    # Must be called with self.lock locked, after name is removed from
+    # self.files
+    def delete(self, name, size):
+        try:
+            os.remove(self.directory / name)
+        except FileNotFoundError:
+            self.bytes -= size
+        except OSError:
+            self.undeleted[name] = size
+        else:
+            self.bytes -= size
+
+    def stats(self):
+        self.lock.lock()
+        stats = { "hits": self.hits,
+                  "misses": self.misses,
+                  "evictions": self.evictions,
+                  "frames": len(self.files),
+                  "used_mb": self.bytes / 1024 / 1024,
+                  "size_mb": self.size / 1024 / 1024 }
+        self.lock.unlock()
+
+        return stats
+
+    @staticmethod
+    def name(key):
+        return hashlib.sha256(repr(key).encode()).hexdigest() + ".npy"
@@ -25,8 +25,14 @@
 
 def View(*_, **__):
     pass
+def ViewScript(*_, **__):
+    pass
 def RemoveView(*_, **__):
     pass
+def SetConversion(*_, **__):
+    pass
+def SetDepth(*_, **__):
+    pass
 def SetFrame(*_, **__):
     pass
 def SetIndex(*_, **__):
@@ -37,10 +43,22 @@ def ClearPreviewGroup(*_, **__):
     pass
 def PreviewGroup(*_, **__):
     pass
+def WarmPreviewGroup(*_, **__):
+    pass
+def ExportPreviewGroup(*_, **__):
+    pass
+def ScanDifferences(*_, **__):
+    pass
+def DifferenceScores(*_, **__):
+    pass
 def Show(*_, **__):
     pass
 def Hide(*_, **__):
     pass
+def Cancel(*_, **__):
+    pass
+def Stats(*_, **__):
+    pass
 
 class App:
     def exec(*_, **__):
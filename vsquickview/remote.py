@@ -0,0 +1,298 @@
+# vsquickview
+# Copyright (c) Akatsumekusa and contributors
+
+# ---------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ---------------------------------------------------------------------
+
+
+import ast
+import concurrent.futures
+import fractions
+import itertools
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client
+import numpy as np
+import os
+from pathlib import Path
+from PySide6.QtCore import QMutex
+from PySide6.QtGui import QImage
+import subprocess
+import sys
+import threading
+import types
+import vapoursynth as vs
+
+# A render worker process running a VapourSynth script for
+# vsqv.ViewScript(), see worker.py. Frames are requested asynchronously
+# and many at a time. The worker renders and packs them into a fixed set
+# of shared memory segments, and they're copied out into buffers from
+# allocate, which is vsquickview's allocateImage(), before the segment is
+# released back to the worker. If the worker exits, every pending and
+# future request fails with vs.Error, and on_exit is called.
+#
+# Callbacks of frame requests are run in a separate thread pool, since
+# they may wait for locks held by threads that are waiting for the reader
+# thread to resolve a "clip" request in RemoteClip.render().
+class RenderWorker:
+    # Seconds to wait for the worker to exit after terminating it
+    ExitTimeout = 5.0
+
+    def __init__(self, script, output, allocate, on_exit=None):
+        self.script = script
+        self.allocate = allocate
+        self.on_exit = on_exit
+        self.lock = QMutex()
+        # { id: concurrent.futures.Future }
+        self.futures = {}
+        self.ids = itertools.count()
+        # { id(ColorTransform): ColorTransform } sent to the worker
+        self.transforms = {}
+        self.closed = False
+        # Names of the shared memory segments of the worker
+        self.segment_names = []
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="vsqv-render-worker")
+
+        authkey = os.urandom(32)
+        self.process = subprocess.Popen([sys.executable, Path(__file__).with_name("worker.py").as_posix()],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.process.stdin.write((authkey.hex() + "\n").encode())
+        self.process.stdin.close()
+        if not (address := self.process.stdout.readline()):
+            raise RuntimeError("vsquickview render worker failed to start.")
+        self.process.stdout.close()
+        self.connection = Client(ast.literal_eval(address.decode()), authkey=authkey)
+
+        self.connection.send(("script", script, output))
+        reply = self.connection.recv()
+        if reply[0] == "error":
+            self.close()
+            raise vs.Error(f"Failed to run \"{script}\" in vsquickview render worker:\n" + reply[2])
+        self.info = reply[1]
+        self.segment_names = reply[2]
+
+        self.reader = threading.Thread(target=self.read, daemon=True)
+        self.reader.start()
+
+    def request(self, message):
+        future = concurrent.futures.Future()
+        future.kind = message[0]
+        self.lock.lock()
+        if self.closed:
+            self.lock.unlock()
+            future.set_exception(vs.Error("vsquickview render worker has exited."))
+            return future
+        id = future.id = next(self.ids)
+        self.futures[id] = future
+        try:
+            self.connection.send((message[0], id, *message[1:]))
+        except OSError:
+            self.futures.pop(id)
+            future.set_exception(vs.Error("vsquickview render worker has exited."))
+        self.lock.unlock()
+        return future
+
+    def read(self):
+        while True:
+            try:
+                reply = self.connection.recv()
+            except (EOFError, OSError):
+                break
+
+            self.lock.lock()
+            future = self.futures.pop(reply[1], None)
+            self.lock.unlock()
+            if future is None:
+                if reply[0] == "frame":
+                    self.release(reply[2])
+                continue
+
+            if reply[0] == "clip":
+                future.set_result(reply[2])
+            elif future.kind == "clip":
+                future.set_exception(vs.Error(reply[2]))
+            else:
+                self.executor.submit(self.resolve, future, reply)
+
+        self.lock.lock()
+        exited = not self.closed
+        self.closed = True
+        futures = list(self.futures.values())
+        self.futures.clear()
+        self.lock.unlock()
+        for future in futures:
+            if future.kind == "clip":
+                future.set_exception(vs.Error("vsquickview render worker has exited."))
+            else:
+                self.executor.submit(future.set_exception, vs.Error("vsquickview render worker has exited."))
+        self.executor.shutdown(wait=False)
+        if exited and self.on_exit:
+            self.on_exit(self)
+
+    def resolve(self, future, reply):
+        if reply[0] == "error":
+            future.set_exception(vs.Error(reply[2]))
+        else:
+            try:
+                image = self.copy(*reply[3:6])
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(RemoteFrame(image, reply[6]))
+            finally:
+                self.release(reply[2])
+
+    # The segment stays owned by the worker, so it's only attached here
+    # without registering it with the resource tracker
+    def copy(self, name, shape, dtype):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        try:
+            image = self.allocate(shape, np.dtype(dtype))
+            image[...] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        finally:
+            shm.close()
+        return image
+
+    def release(self, slot):
+        self.lock.lock()
+        try:
+            self.connection.send(("release", slot))
+        except OSError:
+            pass
+        self.lock.unlock()
+
+    def sendTransform(self, color_transform):
+        if color_transform is None:
+            return None
+
+        self.lock.lock()
+        if id(color_transform) not in self.transforms:
+            self.transforms[id(color_transform)] = color_transform
+            try:
+                self.connection.send(("transform", id(color_transform), color_transform.matrix,
+                                      { bits: color_transform.luts(bits) for bits in [8, 16] }))
+            except OSError:
+                pass
+        self.lock.unlock()
+        return id(color_transform)
+
+    def close(self):
+        self.lock.lock()
+        self.closed = True
+        self.lock.unlock()
+        try:
+            self.connection.close()
+        except (AttributeError, OSError):
+            pass
+        self.process.terminate()
+        try:
+            self.process.wait(RenderWorker.ExitTimeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+        # The worker unlinks its segments when it exits, including the ones
+        # of replies that were never read. This is in case it didn't get to.
+        for name in self.segment_names:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            except OSError:
+                continue
+            shm.close()
+            shm.unlink()
+
+class RemoteFormat:
+    def __init__(self, info):
+        self.name = info["name"]
+        self.color_family = vs.ColorFamily(info["color_family"])
+        self.sample_type = vs.SampleType(info["sample_type"])
+        self.bits_per_sample = info["bits_per_sample"]
+        self.num_planes = info["num_planes"]
+        self.subsampling_w = info["subsampling_w"]
+        self.subsampling_h = info["subsampling_h"]
+
+# Stands in for a vs.VideoNode rendered in a RenderWorker, with the
+# properties of the node and get_frame() and get_frame_async(). spec is
+# None for the output of the script, see Worker.clip() in worker.py.
+class RemoteClip:
+    def __init__(self, worker, spec=None, info=None):
+        self.worker = worker
+        self.spec = spec
+        if info is None:
+            info = worker.info
+        if spec is None:
+            self.id = None
+        else:
+            self.id = info["id"]
+
+        self.width = info["width"]
+        self.height = info["height"]
+        self.num_frames = info["num_frames"]
+        self.fps_num = info["fps_num"]
+        self.fps_den = info["fps_den"]
+        self.fps = fractions.Fraction(self.fps_num, self.fps_den) if self.fps_den else fractions.Fraction(0)
+        self.format = RemoteFormat(info["format"])
+
+    # Returns the RemoteClip of the output of the script converted by
+    # convertClip() or convertTile(), and transformClip()
+    def render(self, depth, level, tile, conversion, color_transform):
+        spec = (depth, level, tile, conversion, self.worker.sendTransform(color_transform))
+        future = self.worker.request(("clip", spec))
+        info = dict(future.result())
+        # The worker keeps the node under the id of the request
+        info["id"] = future.id
+        return RemoteClip(self.worker, spec, info)
+
+    def get_frame_async(self, n):
+        if not 0 <= n < self.num_frames:
+            future = concurrent.futures.Future()
+            future.set_exception(vs.Error("Requested frame number is out of range."))
+            return future
+        return self.worker.request(("frame", self.id, n))
+
+    def get_frame(self, n):
+        return self.get_frame_async(n).result()
+
+# A frame of a RemoteClip, already packed by the worker into the layout of
+# packImage() and copied out of shared memory
+class RemoteFrame:
+    Formats = { "RGBX64": QImage.Format.Format_RGBX64,
+                "RGB888": QImage.Format.Format_RGB888,
+                "Grayscale16": QImage.Format.Format_Grayscale16,
+                "Grayscale8": QImage.Format.Format_Grayscale8 }
+
+    def __init__(self, image, qimage_format):
+        self.image = image
+        self.qimage_format = qimage_format
+        self.height = image.shape[0]
+        self.width = image.shape[1]
+        self.format = types.SimpleNamespace(num_planes=1 if image.ndim == 2 else 3)
+
+    # The plane as a 2D array, like np.asarray(vs.VideoFrame[plane])
+    def __getitem__(self, plane):
+        return self.image if self.image.ndim == 2 else self.image[:, :, plane]
+
+    def qimage(self):
+        return QImage(self.image.data, self.width, self.height, self.image.strides[0], RemoteFrame.Formats[self.qimage_format])
@@ -0,0 +1,67 @@
+# vsquickview
+# Copyright (c) Akatsumekusa and contributors
+
+# ---------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ---------------------------------------------------------------------
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+# Thumbnails of count frames spread evenly over a clip, stored in a single
+# uint8 array. Thumbnails are meant to be loaded in order(), which halves
+# the distance between loaded thumbnails with every power of two loaded,
+# so that the whole clip is covered coarsely first and refined over time.
+# image() returns the loaded thumbnail nearest to a frame.
+class ThumbnailIndex:
+    def __init__(self, count, num_frames, width, height, channels):
+        self.count = min(count, num_frames)
+        self.num_frames = num_frames
+        # The frame each thumbnail is taken from
+        self.frames = np.arange(self.count, dtype=np.int64) * num_frames // self.count
+        self.images = np.zeros((self.count, height, width, channels), dtype=np.uint8)
+        self.loaded = np.zeros(self.count, dtype=np.bool_)
+
+    # Indices into frames, in bit-reversed order
+    def order(self):
+        bits = max(int(self.count - 1).bit_length(), 1)
+        order = [int(format(i, f"0{bits}b")[::-1], 2) for i in range(2 ** bits)]
+        return [i for i in order if i < self.count]
+
+    def insert(self, i, array):
+        self.images[i] = array.reshape(self.images.shape[1:])
+        self.loaded[i] = True
+
+    def loaded_count(self):
+        return int(np.count_nonzero(self.loaded))
+
+    def image(self, frame):
+        loaded = np.flatnonzero(self.loaded)
+        if not loaded.size:
+            return None
+
+        j = np.searchsorted(self.frames[loaded], frame, side="right")
+        candidates = loaded[max(j - 1, 0):j + 1]
+        i = candidates[np.argmin(np.abs(self.frames[candidates] - frame))]
+
+        image = self.images[i]
+        format = QImage.Format.Format_RGB888 if image.shape[2] == 3 else QImage.Format.Format_Grayscale8
+        return QImage(image.data, image.shape[1], image.shape[0], image.strides[0], format).copy()
@@ -24,15 +24,19 @@
 # ---------------------------------------------------------------------
 
 import bisect
-import ctypes
+import collections
+import hashlib
 import itertools
+import math
 import os
 import numpy as np
+import threading
 from pathlib import Path
-from PySide6.QtCore import QObject, QMutex, Property, QReadWriteLock, QRunnable, Signal, Slot, QStandardPaths, QThreadPool
-from PySide6.QtGui import QClipboard, QColorSpace, QGuiApplication, QImage
+from PySide6.QtCore import Qt, QObject, QMutex, Property, QReadWriteLock, QRunnable, Signal, Slot, QStandardPaths, QThread, QThreadPool, QTimer
+from PySide6.QtGui import QClipboard, QColorSpace, QGuiApplication, QImage, QPainter
 from PySide6.QtQml import QQmlApplicationEngine
 from PySide6.QtQuick import QQuickImageProvider
+import time
 import traceback
 import typing
 from typing import Optional, Union
@@ -40,67 +44,209 @@ import vapoursynth as vs
 from vapoursynth import core
 
 
+# Seconds spent in each phase of starting vsquickview, see Stats()
+StartupTimes = {}
+ImportStart = time.perf_counter()
+
+# The clips as passed to vsqv.View()
+Sources = [None] * 10
+# Either 16, 8 or "auto", the bit depth the clips are previewed in. In
+# "auto", frames are loaded in 8-bit while frontend is moving between
+# frames, and again in 16-bit once it rests on a frame, see
+# Backend.requestImage()
+DepthPolicies = [None] * 10
+# Either 16 or 8, the bit depth of Clips, which is 16 for "auto"
+Depths = [None] * 10
+# Either "accurate" or "fast", how the clips are converted to RGB, see
+# convertClip()
+Conversions = [None] * 10
+# Sources converted for previewing at full resolution
 Clips = [None] * 10
-# [(color_space_in, color_space)]
+# [(color space of the frames in Clips, color_space, QColorTransform or
+# None)], with the QColorTransform applied when packing each frame if the
+# conversion to color_space can't be done in VapourSynth
 ClipColorSpaces = [None] * 10
+# [ColorTransform or None], applied to every clip converted from Sources
+ClipColorTransforms = [None] * 10
+# [str or None], identifying the clip and how it's converted across
+# sessions for DiskCache, or None if the clip can't be identified
+ClipDiskKeys = [None] * 10
+# [(identity, conversion) or None], identifying the frames of the clips in
+# Cache, see clipKey(). Indices previewing the same clip share its frames,
+# and frames are kept when a clip is previewed again with vsqv.View().
+ClipKeys = [None] * 10
+# { id(vs.VideoNode): (vs.VideoNode, int) }, numbers identifying the
+# clips that can't be identified by clipDiskKey(), kept as long as
+# ClipKeys refers to them so that the ids aren't reused
+NodeIdentities = {}
+NodeIdentityCounter = itertools.count()
+# { clip key: ThumbnailJob }, the thumbnails of the clips in ClipKeys,
+# loaded from the first time the timeline is shown for the clip, see
+# startThumbnails()
+ClipThumbnails = {}
 Names = [None] * 10
+# [{ (depth, level, tile): clip }], Sources converted in another depth
+# than Clips, downscaled by level for previewing at zoom levels below 1:1,
+# or cropped to a tile for previewing at high zoom levels, created when
+# first requested
+RenderClips = [{} for _ in range(10)]
+RenderClipsLock = QMutex()
 
 
 from .colourbars import ColourBars
+from .convert import TileMargin, TileSize, convertClip, convertTile, transformClip
+from .remote import RemoteClip, RemoteFrame, RenderWorker
+from .arena import MmapArena
+from .diskcache import DiskCache
+from .thumbnails import ThumbnailIndex
+
+# Durations of the most recent loadImage() calls in seconds, see Stats()
+LoadImageTimes = collections.deque(maxlen=1000)
+# The stages of loading and displaying a frame. color is the conversion
+# done by Qt, if any, and display is the time from Backend.updateImage()
+# to imageReady.
+Stages = ["get_frame", "pack", "color", "disk_load", "cache_insert", "display"]
+# [{ stage: durations in seconds }], the most recent durations of each
+# stage for every index, see Stats()
+StageTimes = [{ stage: collections.deque(maxlen=1000) for stage in Stages } for _ in range(10)]
+# [{ "hits": int, "misses": int }], Cache lookups for displaying frames
+DisplayCacheCounts = [{ "hits": 0, "misses": 0 } for _ in range(10)]
+
+# Records { stage: seconds } for index, and adds them to the totals if
+# given
+def recordStages(index, stages, totals=None):
+    for stage, seconds in stages.items():
+        StageTimes[index][stage].append(seconds)
+        if totals is not None:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+
+def loadImage(index, clip, clip_color_space, frame, totals=None):
+    start = time.perf_counter()
+    vs_frame = clip.get_frame(frame)
+    get_frame_end = time.perf_counter()
+    qimage = packImage(vs_frame, clip_color_space[2] is not None)
+    pack_end = time.perf_counter()
+    convertImage(qimage, clip_color_space)
+    end = time.perf_counter()
+
+    LoadImageTimes.append(end - start)
+    recordStages(index, { "get_frame": get_frame_end - start, "pack": pack_end - get_frame_end, "color": end - pack_end }, totals)
 
-def loadImage(clip, clip_color_space, frame):
-    if clip.format.color_family == vs.RGB:
-        if clip.format.bits_per_sample == 16:
-            frame = clip.get_frame(frame)
-            r = np.array(frame[0], dtype=np.uint16)
-            g = np.array(frame[1], dtype=np.uint16)
-            b = np.array(frame[2], dtype=np.uint16)
-            a = np.array([np.iinfo(np.uint16).max], dtype=np.uint16)
-            a = np.broadcast_to(a, (frame.height * frame.width, 1))
-            image = np.hstack((r.reshape((-1, 1)), g.reshape((-1, 1)), b.reshape((-1, 1)), a)).reshape((frame.height, frame.width, 4))
+    return qimage
+
+def cacheMmapDirectory():
+    if "VSQV_CACHE_MMAP_DIRECTORY" in os.environ:
+        directory = Path(os.environ["VSQV_CACHE_MMAP_DIRECTORY"])
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+    else:
+        return None
+
+# If VSQV_CACHE_MMAP_DIRECTORY is set, the pixels of packed frames are
+# stored in memory-mapped temporary files in the directory instead of on
+# the heap, see MmapArena. The files are deleted immediately and only
+# exist as long as they're mapped, but until then the OS may write them
+# back to disk and drop them from memory under memory pressure.
+CacheMmapDirectory = cacheMmapDirectory()
+CacheMmapArena = MmapArena(CacheMmapDirectory) if CacheMmapDirectory is not None else None
+
+# Frames allocated from the arena of an earlier directory keep it alive
+# until they're evicted
+def updateCacheMmapArena():
+    global CacheMmapDirectory
+    global CacheMmapArena
+
+    CacheMmapDirectory = cacheMmapDirectory()
+    if CacheMmapDirectory is None:
+        CacheMmapArena = None
+    elif CacheMmapArena is None or CacheMmapArena.directory != CacheMmapDirectory:
+        CacheMmapArena = MmapArena(CacheMmapDirectory)
+
+def allocateImage(shape, dtype):
+    if (arena := CacheMmapArena) is None:
+        return np.empty(shape, dtype=dtype)
+
+    return arena.allocate(shape, dtype)
+
+# Wraps a plane of a VapourSynth frame in a QImage without copying. The
+# QImage holds the buffer of frame[plane], which in turn holds the frame,
+# so the frame stays alive for as long as the QImage does. The pixels
+# belong to VapourSynth and the QImage must not be modified.
+def wrapPlane(frame, plane, format):
+    image = np.asarray(frame[plane])
+    return QImage(image.data, frame.width, frame.height, image.strides[0], format)
+
+# writable should be True if the QImage is to be modified afterwards, such
+# as for colour conversion in convertImage().
+def packImage(frame, writable=False):
+    # Frames from the render worker are already packed
+    if isinstance(frame, RemoteFrame):
+        return frame.qimage()
+
+    # The planes are written straight into one interleaved buffer which is
+    # then wrapped by the QImage without any further copy. The buffer is
+    # owned by the QImage, and is therefore kept alive as long as the
+    # QImage stays in Cache.
+    if frame.format.color_family == vs.RGB:
+        if frame.format.bits_per_sample == 16:
+            image = allocateImage((frame.height, frame.width, 4), np.uint16)
+            for plane in range(3):
+                image[:, :, plane] = np.asarray(frame[plane])
+            image[:, :, 3] = np.iinfo(np.uint16).max
             qimage = QImage(image.data, frame.width, frame.height, image.strides[0], QImage.Format.Format_RGBX64)
 
-        elif clip.format.bits_per_sample == 8:
-            frame = clip.get_frame(frame)
-            r = np.array(frame[0], dtype=np.uint8)
-            g = np.array(frame[1], dtype=np.uint8)
-            b = np.array(frame[2], dtype=np.uint8)
-            image = np.hstack((r.reshape((-1, 1)), g.reshape((-1, 1)), b.reshape((-1, 1)))).reshape((frame.height, frame.width, 3))
+        elif frame.format.bits_per_sample == 8:
+            image = allocateImage((frame.height, frame.width, 3), np.uint8)
+            for plane in range(3):
+                image[:, :, plane] = np.asarray(frame[plane])
             qimage = QImage(image.data, frame.width, frame.height, image.strides[0], QImage.Format.Format_RGB888)
 
-    elif clip.format.color_family == vs.GRAY:
-        if clip.format.bits_per_sample == 16:
-            frame = clip.get_frame(frame)
-            ptr = ctypes.cast(frame.get_read_ptr(0), ctypes.POINTER(ctypes.c_uint16 * (frame.height * frame.get_stride(0))))
-            qimage = QImage(ptr.contents, frame.width, frame.height, frame.get_stride(0), QImage.Format.Format_Grayscale16).copy()
+    # Single plane frames are displayed straight from VapourSynth's buffer,
+    # unless they're modified or need to go to CacheMmapArena
+    elif frame.format.color_family == vs.GRAY and \
+         not writable and CacheMmapArena is None:
+        if frame.format.bits_per_sample == 16:
+            qimage = wrapPlane(frame, 0, QImage.Format.Format_Grayscale16)
 
-        elif clip.format.bits_per_sample == 8:
-            frame = clip.get_frame(frame)
-            ptr = ctypes.cast(frame.get_read_ptr(0), ctypes.POINTER(ctypes.c_uint8 * (frame.height * frame.get_stride(0))))
-            qimage = QImage(ptr.contents, frame.width, frame.height, frame.get_stride(0), QImage.Format.Format_Grayscale8).copy()
+        elif frame.format.bits_per_sample == 8:
+            qimage = wrapPlane(frame, 0, QImage.Format.Format_Grayscale8)
 
-    qimage.setColorSpace(clip_color_space[0])
-    if clip_color_space[1] != clip_color_space[0]:
-        qimage.convertToColorSpace(clip_color_space[1])
+    elif frame.format.color_family == vs.GRAY:
+        if frame.format.bits_per_sample == 16:
+            image = allocateImage((frame.height, frame.width), np.uint16)
+            image[:, :] = np.asarray(frame[0])
+            qimage = QImage(image.data, frame.width, frame.height, image.strides[0], QImage.Format.Format_Grayscale16)
+
+        elif frame.format.bits_per_sample == 8:
+            image = allocateImage((frame.height, frame.width), np.uint8)
+            image[:, :] = np.asarray(frame[0])
+            qimage = QImage(image.data, frame.width, frame.height, image.strides[0], QImage.Format.Format_Grayscale8)
 
     return qimage
 
-ColourBarsCaches = {}
-ColourBarsCaches[0] = loadImage(ColourBars, (QColorSpace(QColorSpace.SRgb), QColorSpace(QColorSpace.SRgb)), 0)
+def convertImage(qimage, clip_color_space):
+    qimage.setColorSpace(clip_color_space[0])
+    if clip_color_space[2] is not None:
+        qimage.applyColorTransform(clip_color_space[2])
+        qimage.setColorSpace(clip_color_space[1])
+
 
 
 # The image provider in autoclip is unsynced.
-# When frontend triggers a new frame, the request is sent into priority
-# ThreadPool. When a task in the ThreadPool is completed, it checks the linked
-# list to see if the result is still needed. If so, it set the QImage to
-# Frame, remove anything later than the frame in linked list and trigger a
-# rerender
-Image = ColourBarsCaches[0]
+# Every time frontend triggers a new frame, Backend.updateImage() gives the
+# request a new generation and sends it into priority ThreadPool, clearing
+# requests that haven't started yet. A request that is superseded before it
+# starts is dropped. When a request is completed, it sets the QImage to
+# Image and triggers a rerender only if no request of a newer generation
+# has been displayed already, otherwise the result is only cached.
+# None until the first frame is displayed, and the colour bar is shown
+Image = None
 ImageLock = QMutex()
-# { "index": 0, "frame": 0, "prev": None }
-ImagesPending = None
-ImagesPendingCount = 0
-ImagesPendingLock = QMutex()
+DisplayGeneration = 0
+DisplayedGeneration = 0
+DisplayLock = QMutex()
+# Seconds from Backend.updateImage() to imageReady, see Stats()
+DisplayLatencies = collections.deque(maxlen=1000)
 
 class ImageProvider(QQuickImageProvider):
     def __init__(self):
@@ -111,137 +257,1127 @@ class ImageProvider(QQuickImageProvider):
         img = Image
         ImageLock.unlock()
 
+        if img is None:
+            img = ColourBars()
+
         return img
 
+# Thumbnails for the timeline of frontend, requested as
+# "image://thumbnails/index/frame/version"
+class ThumbnailProvider(QQuickImageProvider):
+    def __init__(self):
+        super().__init__(QQuickImageProvider.ImageType.Image)
+
+    def requestImage(self, id, size, requestedSize):
+        index, frame = [int(part) for part in id.split("/")[:2]]
+        job = ClipThumbnails.get(ClipKeys[index]) if 0 <= index < 10 else None
+
+        if job is None or (img := job.thumbnails.image(frame)) is None:
+            img = QImage(1, 1, QImage.Format.Format_RGB888)
+            img.fill(0)
+
+        return img
+
+
+# Frames of all ten indices share one cache which is budgeted in bytes
+# and evicts the least recently used frame first. The budget is set
+# using os.environ["VSQV_CACHE_MB"].
+class FrameCache:
+    def __init__(self, size):
+        self.size = size
+        self.bytes = 0
+        # { (clip key, frame, depth, level, tile): QImage }, from least to
+        # most recently used, with the clip key from ClipKeys and tile
+        # being None for the whole frame
+        self.images = collections.OrderedDict()
+        self.lock = QMutex()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        self.lock.lock()
+        if key in self.images:
+            self.images.move_to_end(key)
+            img = self.images[key]
+            self.hits += 1
+        else:
+            img = None
+            self.misses += 1
+        self.lock.unlock()
+
+        return img
+
+    def contains(self, key):
+        self.lock.lock()
+        contains = key in self.images
+        self.lock.unlock()
+
+        return contains
+
+    def insert(self, key, img):
+        self.lock.lock()
+        if key in self.images:
+            self.bytes -= self.images.pop(key).sizeInBytes()
+        self.images[key] = img
+        self.bytes += img.sizeInBytes()
+        self.evict()
+        self.lock.unlock()
+
+    def removeClip(self, clip_key):
+        self.lock.lock()
+        for key in [key for key in self.images if key[0] == clip_key]:
+            self.bytes -= self.images.pop(key).sizeInBytes()
+        self.lock.unlock()
+
+    def resize(self, size):
+        self.lock.lock()
+        self.size = size
+        self.evict()
+        self.lock.unlock()
+
+    # Always keeps the most recently used frame, even if it alone is larger
+    # than the budget. Must be called with self.lock locked.
+    def evict(self):
+        while self.bytes > self.size and len(self.images) > 1:
+            self.bytes -= self.images.popitem(last=False)[1].sizeInBytes()
+            self.evictions += 1
+
+    def stats(self):
+        self.lock.lock()
+        stats = { "hits": self.hits,
+                  "misses": self.misses,
+                  "evictions": self.evictions,
+                  "frames": len(self.images),
+                  "used_mb": self.bytes / 1024 / 1024,
+                  "size_mb": self.size / 1024 / 1024 }
+        self.lock.unlock()
+
+        return stats
+
+def cacheSize():
+    if "VSQV_CACHE_MB" in os.environ:
+        try:
+            size = float(os.environ["VSQV_CACHE_MB"])
+        except:
+            raise ValueError("Environment variable \"VSQV_CACHE_MB\" was set but isn't a number.")
+        if np.isnan(size):
+            raise ValueError("Environment variable \"VSQV_CACHE_MB\" was set but is not a number.")
+        if size < 0.0:
+            raise ValueError("Environment variable \"VSQV_CACHE_MB\" is less than 0.")
+        return int(size * 1024 * 1024)
+    else:
+        return 2048 * 1024 * 1024
+
+Cache = FrameCache(cacheSize())
+
+def prefetchCount():
+    if "VSQV_PREFETCH_FRAMES" in os.environ:
+        try:
+            count = int(os.environ["VSQV_PREFETCH_FRAMES"])
+        except:
+            raise ValueError("Environment variable \"VSQV_PREFETCH_FRAMES\" was set but isn't an integer.")
+        if count < 0:
+            raise ValueError("Environment variable \"VSQV_PREFETCH_FRAMES\" is less than 0.")
+        return count
+    else:
+        return 6
+
+PrefetchCount = prefetchCount()
+
+def diskCache():
+    if "VSQV_DISK_CACHE_DIRECTORY" not in os.environ:
+        return None
+
+    if "VSQV_DISK_CACHE_MB" in os.environ:
+        try:
+            size = float(os.environ["VSQV_DISK_CACHE_MB"])
+        except:
+            raise ValueError("Environment variable \"VSQV_DISK_CACHE_MB\" was set but isn't a number.")
+        if np.isnan(size):
+            raise ValueError("Environment variable \"VSQV_DISK_CACHE_MB\" was set but is not a number.")
+        if size < 0.0:
+            raise ValueError("Environment variable \"VSQV_DISK_CACHE_MB\" is less than 0.")
+        size = int(size * 1024 * 1024)
+    else:
+        size = 10240 * 1024 * 1024
+
+    if FrameDiskCache is not None and \
+       FrameDiskCache.directory == Path(os.environ["VSQV_DISK_CACHE_DIRECTORY"]):
+        FrameDiskCache.resize(size)
+        return FrameDiskCache
+    else:
+        return DiskCache(os.environ["VSQV_DISK_CACHE_DIRECTORY"], size)
+
+# Frames are also saved to FrameDiskCache if VSQV_DISK_CACHE_DIRECTORY is
+# set, so that they can be loaded from disk after the kernel restarts
+FrameDiskCache = None
+FrameDiskCache = diskCache()
+# Increase this whenever the way frames are converted changes so that
+# frames saved by earlier versions are no longer used
+DiskCacheVersion = 2
+
+# Frames are saved in a single thread in the background. Every frame
+# queued to be saved is kept in memory until it's written, even after it's
+# evicted from Cache, so frames are not saved while DiskCachePendingLimit
+# bytes are already waiting, such as when warming the preview group or
+# playing a clip faster than the disk can keep up.
+DiskCacheThreadPool = QThreadPool()
+DiskCacheThreadPool.setMaxThreadCount(1)
+DiskCachePendingLimit = 256 * 1024 * 1024
+DiskCachePending = 0
+DiskCachePendingLock = QMutex()
+
+# { QImage.Format: (dtype, channels) }
+DiskImageFormats = { QImage.Format.Format_RGBX64: (np.uint16, 4),
+                     QImage.Format.Format_RGB888: (np.uint8, 3),
+                     QImage.Format.Format_Grayscale16: (np.uint16, 1),
+                     QImage.Format.Format_Grayscale8: (np.uint8, 1) }
+
+def loadDiskImage(index, frame, depth, level, tile):
+    if FrameDiskCache is None or ClipDiskKeys[index] is None:
+        return None
+
+    image = FrameDiskCache.get((ClipDiskKeys[index], Conversions[index], frame, depth, level, tile), allocateImage)
+    if image is None:
+        return None
+
+    for format, (dtype, channels) in DiskImageFormats.items():
+        if image.dtype == dtype and image.shape[2] == channels:
+            break
+    else:
+        return None
+    qimage = QImage(image.data, image.shape[1], image.shape[0], image.strides[0], format)
+    qimage.setColorSpace(ClipColorSpaces[index][1])
+
+    return qimage
+
+def saveDiskImage(index, frame, depth, level, tile, qimage):
+    global DiskCachePending
+
+    if FrameDiskCache is None or ClipDiskKeys[index] is None or \
+       qimage.format() not in DiskImageFormats:
+        return
+
+    DiskCachePendingLock.lock()
+    if DiskCachePending and DiskCachePending + qimage.sizeInBytes() > DiskCachePendingLimit:
+        DiskCachePendingLock.unlock()
+        return
+    DiskCachePending += qimage.sizeInBytes()
+    DiskCachePendingLock.unlock()
+
+    DiskCacheThreadPool.start(SaveDiskImage(FrameDiskCache, (ClipDiskKeys[index], Conversions[index], frame, depth, level, tile), qimage))
+
+class SaveDiskImage(QRunnable):
+    def __init__(self, disk_cache, key, qimage):
+        super().__init__()
+
+        self.disk_cache = disk_cache
+        self.key = key
+        self.qimage = qimage
+
+    def run(self):
+        global DiskCachePending
+
+        try:
+            dtype, channels = DiskImageFormats[self.qimage.format()]
+            itemsize = np.dtype(dtype).itemsize
+            image = np.frombuffer(self.qimage.constBits(), dtype=dtype, count=self.qimage.sizeInBytes() // itemsize)
+            image = image.reshape(self.qimage.height(), self.qimage.bytesPerLine() // itemsize)[:, :self.qimage.width() * channels]
+            self.disk_cache.insert(self.key, image.reshape(self.qimage.height(), self.qimage.width(), channels))
+        finally:
+            DiskCachePendingLock.lock()
+            DiskCachePending -= self.qimage.sizeInBytes()
+            DiskCachePendingLock.unlock()
+            self.qimage = None
+
+# Identifies a clip by the filters and the arguments it's created with,
+# using VapourSynth's graph inspection. Files passed as arguments are
+# identified by their path, size and modification time. Returns None if
+# graph inspection isn't enabled using core.enable_graph_inspection(),
+# the clip uses arguments that can't be identified such as Python
+# functions, or the graph is too large.
+def graphKey(clip):
+    count = 0
+
+    def node(clip):
+        nonlocal count
+        count += 1
+        if count > 10000:
+            raise RecursionError()
+        return (clip._name, [(name, value(clip._inputs[name])) for name in sorted(clip._inputs)])
+
+    def value(value_):
+        if isinstance(value_, (vs.VideoNode, vs.AudioNode)):
+            return node(value_)
+        elif isinstance(value_, (list, tuple)):
+            return [value(v) for v in value_]
+        elif isinstance(value_, str) and os.path.isfile(value_):
+            stat = os.stat(value_)
+            return (value_, stat.st_size, stat.st_mtime_ns)
+        elif isinstance(value_, (int, float, str, bytes)) or value_ is None:
+            return value_
+        else:
+            raise TypeError()
+
+    try:
+        return node(clip)
+    except Exception:
+        return None
+
+def clipDiskKey(clip, cache_key, color_space_in, color_space):
+    if cache_key is None:
+        if (cache_key := graphKey(clip)) is None:
+            return None
+
+    return hashlib.sha256(repr((DiskCacheVersion, cache_key, clip.width, clip.height, clip.num_frames, clip.format.name,
+                                TileSize, TileMargin,
+                                bytes(color_space_in.iccProfile()), bytes(color_space.iccProfile()))).encode()).hexdigest()
+
+# node is the clip as passed to vsqv.View(), and source the clip in
+# Sources
+def clipKey(node, source, cache_key, color_space_in, color_space, conversion):
+    if (identity := clipDiskKey(source, cache_key, color_space_in, color_space)) is None:
+        if id(node) not in NodeIdentities:
+            NodeIdentities[id(node)] = (node, next(NodeIdentityCounter))
+        identity = (NodeIdentities[id(node)][1],
+                    hashlib.sha256(repr((bytes(color_space_in.iccProfile()), bytes(color_space.iccProfile()))).encode()).hexdigest())
+    return (identity, conversion)
+
+# Removes the frames of a clip from Cache once no index previews it any
+# more. Must be called with AsyncLock locked.
+def releaseClipKey(clip_key):
+    if clip_key is None or clip_key in ClipKeys:
+        return
+
+    Cache.removeClip(clip_key)
+    ClipThumbnails.pop(clip_key, None)
+    numbers = { key[0][0] for key in ClipKeys if key is not None and isinstance(key[0], tuple) }
+    for node_id in [node_id for node_id, (_, number) in NodeIdentities.items() if number not in numbers]:
+        del NodeIdentities[node_id]
+
+def downscalePreview():
+    return os.environ.get("VSQV_DOWNSCALE_PREVIEW", "1") != "0"
+
+DownscalePreview = downscalePreview()
+
+def tileZoom():
+    if "VSQV_TILE_ZOOM" in os.environ:
+        try:
+            zoom = float(os.environ["VSQV_TILE_ZOOM"])
+        except:
+            raise ValueError("Environment variable \"VSQV_TILE_ZOOM\" was set but isn't a number.")
+        if np.isnan(zoom):
+            raise ValueError("Environment variable \"VSQV_TILE_ZOOM\" was set but is not a number.")
+        if zoom < 0.0:
+            raise ValueError("Environment variable \"VSQV_TILE_ZOOM\" is less than 0.")
+        return zoom
+    else:
+        return 4.0
+
+# At zoom levels of TileZoom and above, only the tiles of TileSize x
+# TileSize pixels that are visible are loaded, see convertTile().
+TileZoom = tileZoom()
+
+# Seconds of frames loaded ahead during playback, and the fps playback
+# uses for clips with variable frame rate
+PlaybackPrefetchSeconds = 0.5
+PlaybackDefaultFps = 24000 / 1001
+
+# Milliseconds frontend has to rest on a frame before an index in "auto"
+# depth loads it again in 16-bit
+AutoDepthRestDelay = 250
+
+def defaultDepth():
+    return 8 if "VSQV_FORCE_8_BIT" in os.environ else 16
+
+# Converts source in this process, or in the render worker for clips from
+# vsqv.ViewScript()
+def buildClip(source, depth, level=1, tile=None, conversion="accurate", color_transform=None):
+    if isinstance(source, RemoteClip):
+        return source.render(depth, level, tile, conversion, color_transform)
+
+    if tile is None:
+        clip = convertClip(source, depth, level, conversion)
+    else:
+        clip = convertTile(source, depth, tile, conversion)
+    return transformClip(clip, color_transform)
+
+def renderClip(index, depth, level, tile=None):
+    if depth == Depths[index] and level == 1 and tile is None:
+        return Clips[index]
+
+    RenderClipsLock.lock()
+    render_clips = RenderClips[index]
+    clip = render_clips.get((depth, level, tile))
+    source = Sources[index]
+    conversion = Conversions[index]
+    color_transform = ClipColorTransforms[index]
+    RenderClipsLock.unlock()
+
+    # The clip is built outside RenderClipsLock, since building a clip in
+    # the render worker waits for the worker and fails if it has exited.
+    # vsqv.View() and vsqv.SetConversion() replace RenderClips[index].
+    if clip is None and source:
+        clip = buildClip(source, depth, level, tile, conversion, color_transform)
+        RenderClipsLock.lock()
+        clip = render_clips.setdefault((depth, level, tile), clip)
+        RenderClipsLock.unlock()
+
+    return clip
+
+# Clips with variable dimensions are always loaded at full resolution,
+# since convertClip() doesn't downscale them
+def clipLevel(clip, level):
+    return 1 if clip.width == 0 or clip.height == 0 else level
+
+# Returns the list of tiles in the range (tx0, ty0, tx1, ty1) that are
+# inside a frame of width x height, or None if they cover the whole frame
+# or the clip has variable dimensions. When the view is panned past the
+# edge of the frame, the range is clamped to the tiles along the edge so
+# that it's never empty.
+def visibleTiles(tiles, width, height):
+    if width == 0 or height == 0:
+        return None
+
+    columns = -(-width // TileSize)
+    rows = -(-height // TileSize)
+    tx0 = max(0, min(tiles[0], columns - 1))
+    ty0 = max(0, min(tiles[1], rows - 1))
+    tx1 = max(tx0 + 1, min(tiles[2], columns))
+    ty1 = max(ty0 + 1, min(tiles[3], rows))
+    if tx0 == 0 and ty0 == 0 and tx1 == columns and ty1 == rows:
+        return None
+
+    return [(tx, ty) for ty in range(ty0, ty1) for tx in range(tx0, tx1)]
+
+# Paints the tiles [(tile, QImage)] into a single QImage, returning it
+# together with its offset in the frame
+def composeTiles(tiles):
+    x0 = min([tile[0] for tile, _ in tiles]) * TileSize
+    y0 = min([tile[1] for tile, _ in tiles]) * TileSize
+    width = max([tile[0] * TileSize + img.width() for tile, img in tiles]) - x0
+    height = max([tile[1] * TileSize + img.height() for tile, img in tiles]) - y0
+
+    qimage = QImage(width, height, tiles[0][1].format())
+    qimage.setColorSpace(tiles[0][1].colorSpace())
+    painter = QPainter(qimage)
+    painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+    for tile, img in tiles:
+        painter.drawImage(tile[0] * TileSize - x0, tile[1] * TileSize - y0, img)
+    painter.end()
+
+    return qimage, x0, y0
 
-Caches = [{}] * 10
-CacheHeads = [0] * 10
-CacheLocks = []
-for _ in range(10):
-    CacheLocks.append(QReadWriteLock())
-CacheMinimumSize = 10
-CacheCleaningFrequency = 5
-    
 # Loading frames to be displayed is using tryStart()
-# When ThreadPool is full, all even frame loads are 5 and all odd frame
-# loads are 4
-# Preloading frames is 2
-# Cache cleaning is runned in reserved thread
+# When ThreadPool is full, the queued request is replaced by the newest
+# request with priority 5
+# Preloading frames is done asynchronously, see AsyncQueue
 CacheThreadPool = QThreadPool()
 CacheThreadPool.setMaxThreadCount(2)
 # This lock is used when adding runnables to CacheThreadPool
 # vsqv.View() and vsqv.RemoveView() uses the write lock,
-# Backend.updateImage() and LoadImageOfNearbyIndex() uses the read lock
+# Backend.updateImage() uses the read lock
 CacheThreadPoolLock = QReadWriteLock()
 
-LoadImageOfNearbyIndexThreadPool = QThreadPool()
-LoadImageOfNearbyIndexThreadPool.setMaxThreadCount(1)
+def framesInFlightLimit():
+    if "VSQV_FRAMES_IN_FLIGHT" in os.environ:
+        try:
+            limit = int(os.environ["VSQV_FRAMES_IN_FLIGHT"])
+        except:
+            raise ValueError("Environment variable \"VSQV_FRAMES_IN_FLIGHT\" was set but isn't an integer.")
+        if limit < 1:
+            raise ValueError("Environment variable \"VSQV_FRAMES_IN_FLIGHT\" is less than 1.")
+        return limit
+    else:
+        return max(core.num_threads, 1)
+
+# Frames that are only loaded into Cache, such as prefetches, frames of
+# nearby indices and frames of the preview group, are requested using
+# get_frame_async() so that VapourSynth can work on many of them at once
+# instead of one frame per thread in a QThreadPool.
+# At most FramesInFlightLimit requests are sent to VapourSynth at a time,
+# and the rest wait in AsyncQueue in the order they will be sent. Requests
+# that have become stale are dropped before they are sent.
+AsyncQueue = collections.deque()
+FramesInFlight = 0
+FramesInFlightLimit = framesInFlightLimit()
+# { key: [AsyncRequest] } of the frames sent to VapourSynth. Requests for
+# a frame that's already in flight are attached to it instead of being
+# sent again, and are all done when it arrives.
+AsyncInFlight = {}
+# This lock protects AsyncQueue, FramesInFlight and AsyncInFlight, and is
+# also held by vsqv.View() and vsqv.RemoveView() when removing frames of an
+# index from Cache, so that a request for a replaced clip can't be
+# inserted after.
+AsyncLock = QMutex()
+
+class AsyncRequest:
+    def __init__(self, index, frame, level=1, tile=None, is_stale=None, on_done=None, depth=None, clip=None, on_frame=None):
+        self.index = index
+        self.frame = frame
+        self.level = level
+        self.tile = tile
+        # None for the depth of Clips
+        self.depth = depth
+        # If clip is set, the frame is requested from clip instead of the
+        # clip at index, and on_frame(request, frame) is called with the
+        # vs.VideoFrame instead of inserting it into Cache
+        self.clip = clip
+        self.on_frame = on_frame
+        # is_stale() is called before the request is sent to VapourSynth
+        self.is_stale = is_stale
+        # on_done(request) is called exactly once after the request is
+        # loaded, found in Cache, dropped as stale or failed
+        self.on_done = on_done
+
+    def done(self):
+        if self.on_done:
+            self.on_done(self)
+
+def requestImagesAsync(requests, first=False):
+    AsyncLock.lock()
+    if first:
+        AsyncQueue.extendleft(reversed(requests))
+    else:
+        AsyncQueue.extend(requests)
+    AsyncLock.unlock()
+
+    pumpAsyncQueue()
+
+def dropStaleAsyncRequests():
+    AsyncLock.lock()
+    requests = list(AsyncQueue)
+    AsyncQueue.clear()
+    stale_requests = []
+    for request in requests:
+        if request.is_stale and request.is_stale():
+            stale_requests.append(request)
+        else:
+            AsyncQueue.append(request)
+    AsyncLock.unlock()
+
+    for request in stale_requests:
+        request.done()
+
+# Set in a thread while it's in pumpAsyncQueue(). Futures that have already
+# failed, such as those of a render worker that has exited, call their
+# callbacks immediately, and the requests that the callbacks queue are
+# then picked up by the loop instead of recursing once per request.
+AsyncPumping = threading.local()
 
+def pumpAsyncQueue():
+    global FramesInFlight
+
+    if getattr(AsyncPumping, "active", False):
+        return
+    AsyncPumping.active = True
+    try:
+        while True:
+            AsyncLock.lock()
+            if FramesInFlight >= FramesInFlightLimit or not AsyncQueue:
+                AsyncLock.unlock()
+                return
+
+            request = AsyncQueue.popleft()
+            source = Sources[request.index]
+            if source:
+                depth = request.depth or Depths[request.index]
+                level = clipLevel(source, request.level)
+                key = (ClipKeys[request.index], request.frame, depth, level, request.tile)
+            if (request.is_stale and request.is_stale()) or \
+               not source or \
+               not 0 <= request.frame < source.num_frames or \
+               (not request.on_frame and Cache.contains(key)):
+                AsyncLock.unlock()
+                request.done()
+                continue
+            if not request.on_frame and key in AsyncInFlight:
+                AsyncInFlight[key].append(request)
+                AsyncLock.unlock()
+                continue
+
+            if request.on_frame:
+                FramesInFlight += 1
+                AsyncLock.unlock()
+
+                future = request.clip.get_frame_async(request.frame)
+                future.add_done_callback(lambda future, request=request: onAsyncVideoFrame(request, future))
+                continue
+
+            start = time.perf_counter()
+            if (img := loadDiskImage(request.index, request.frame, depth, level, request.tile)) is not None:
+                disk_load_end = time.perf_counter()
+                Cache.insert(key, img)
+                recordStages(request.index, { "disk_load": disk_load_end - start, "cache_insert": time.perf_counter() - disk_load_end })
+                AsyncLock.unlock()
+                request.done()
+                continue
+
+            try:
+                clip = renderClip(request.index, depth, level, request.tile)
+            except Exception:
+                traceback.print_exc()
+                AsyncLock.unlock()
+                request.done()
+                continue
+            FramesInFlight += 1
+            AsyncInFlight[key] = [request]
+            clip_color_space = ClipColorSpaces[request.index]
+            AsyncLock.unlock()
+
+            start = time.perf_counter()
+            future = clip.get_frame_async(request.frame)
+            future.add_done_callback(lambda future, request=request, key=key, clip_color_space=clip_color_space, start=start: \
+                                         onAsyncFrame(request, key, clip_color_space, start, future))
+    finally:
+        AsyncPumping.active = False
+
+def onAsyncFrame(request, key, clip_color_space, start, future):
+    global FramesInFlight
+
+    try:
+        frame = future.result()
+        get_frame_end = time.perf_counter()
+        img = packImage(frame, clip_color_space[2] is not None)
+        pack_end = time.perf_counter()
+        convertImage(img, clip_color_space)
+        end = time.perf_counter()
+        LoadImageTimes.append(end - start)
+
+        # The frame is still cached if the clip was previewed again, or is
+        # previewed at another index
+        AsyncLock.lock()
+        if key[0] in ClipKeys:
+            Cache.insert(key, img)
+            recordStages(request.index, { "get_frame": get_frame_end - start, "pack": pack_end - get_frame_end, "color": end - pack_end,
+                                          "cache_insert": time.perf_counter() - end })
+        # Only saved to disk if the index still previews the clip with the
+        # same conversion, since the disk key is taken from the index
+        if key[0] == ClipKeys[request.index]:
+            saveDiskImage(request.index, request.frame, key[2], key[3], request.tile, img)
+        AsyncLock.unlock()
+    except Exception:
+        traceback.print_exc()
+
+    AsyncLock.lock()
+    FramesInFlight -= 1
+    requests = AsyncInFlight.pop(key)
+    AsyncLock.unlock()
+
+    for request in requests:
+        request.done()
+    pumpAsyncQueue()
+
+def onAsyncVideoFrame(request, future):
+    global FramesInFlight
+
+    try:
+        request.on_frame(request, future.result())
+    except Exception:
+        traceback.print_exc()
+
+    AsyncLock.lock()
+    FramesInFlight -= 1
+    AsyncLock.unlock()
+
+    request.done()
+    pumpAsyncQueue()
+
+# Every display request increases PrefetchGeneration, which makes the
+# prefetches and the loads of nearby indices queued for the previous
+# frame stale.
+PrefetchGeneration = 0
+PrefetchLock = QMutex()
+
+# Long running jobs such as warming the preview group report their
+# progress in backend.status. vsqv.Cancel() increases BackgroundGeneration,
+# which stops all jobs created before, while WarmGeneration and
+# ScanGeneration only stop older warming jobs and difference scans.
+BackgroundGeneration = 0
+WarmGeneration = 0
+ScanGeneration = 0
+BackgroundLock = QMutex()
 
 class RequestImage(QRunnable):
-    def __init__(self, index, frame, do_display=False):
+    def __init__(self, index, frame, depth, level, tiles, generation, requested_at):
         super().__init__()
 
         self.index = index
         self.frame = frame
-        self.do_display = do_display
+        # None for the depth of Clips
+        self.depth = depth
+        self.level = level
+        self.tiles = tiles
+        self.generation = generation
+        self.requested_at = requested_at
+        # { stage: seconds } summed over all tiles, for Backend.statsText
+        self.stages = {}
+        self.cached = True
 
     def run(self):
-        if Clips[self.index] and \
-           0 <= self.frame < Clips[self.index].num_frames:
-            if self.do_display:
-                if CacheLocks[self.index].tryLockForRead() and \
-                   self.frame in Caches[self.index]:
-                    img = Caches[self.index][self.frame]
-                    CacheLocks[self.index].unlock()
-                    self.update_Image(img)
-                else:
-                    CacheLocks[self.index].unlock()
-                    img = loadImage(Clips[self.index], ClipColorSpaces[self.index], self.frame)
-                    self.update_Image(img)
-                    self.update_Cache(img)
-                
+        DisplayLock.lock()
+        is_stale = self.generation != DisplayGeneration
+        DisplayLock.unlock()
+        if is_stale:
+            return
+
+        clip = Clips[self.index]
+        if clip and \
+           0 <= self.frame < clip.num_frames:
+            self.depth = self.depth or Depths[self.index]
+            if self.tiles is not None and \
+               (tiles := visibleTiles(self.tiles, clip.width, clip.height)) is not None:
+                images = [(tile, self.load_Image(1, tile)) for tile in tiles]
+                img, x, y = composeTiles(images)
+                self.update_Image(img, 1, x, y, clip.width, clip.height)
+            else:
+                # Clips with variable dimensions report the size of the
+                # frame itself
+                level = clipLevel(clip, self.level)
+                img = self.load_Image(level, None)
+                self.update_Image(img, level, 0, 0, clip.width or img.width(), clip.height or img.height())
+        else:
+            img = ColourBars()
+            self.update_Image(img, 1, 0, 0, img.width(), img.height())
+
+    def load_Image(self, level, tile):
+        img = Cache.get((ClipKeys[self.index], self.frame, self.depth, level, tile))
+        if img is None:
+            DisplayCacheCounts[self.index]["misses"] += 1
+            self.cached = False
+
+            start = time.perf_counter()
+            img = loadDiskImage(self.index, self.frame, self.depth, level, tile)
+            if img is not None:
+                recordStages(self.index, { "disk_load": time.perf_counter() - start }, self.stages)
             else:
-                CacheLocks[self.index].lockForRead()
-                if self.frame in Caches[self.index]:
-                    CacheLocks[self.index].unlock()
-                else:
-                    CacheLocks[self.index].unlock()
-                    img = loadImage(Clips[self.index], ClipColorSpaces[self.index], self.frame)
-                    self.update_Cache(img)
+                img = loadImage(self.index, renderClip(self.index, self.depth, level, tile), ClipColorSpaces[self.index], self.frame, self.stages)
+                saveDiskImage(self.index, self.frame, self.depth, level, tile, img)
+
+            start = time.perf_counter()
+            Cache.insert((ClipKeys[self.index], self.frame, self.depth, level, tile), img)
+            recordStages(self.index, { "cache_insert": time.perf_counter() - start }, self.stages)
         else:
-            if self.do_display:
-                self.update_Image(ColourBarsCaches[0])
+            DisplayCacheCounts[self.index]["hits"] += 1
+        return img
                 
-    def update_Image(self, img):
+    def update_Image(self, img, level, x, y, full_width, full_height):
         global Image
+        global DisplayedGeneration
         
-        ImagesPendingLock.lock()
-        head = ImagesPending
-        while head:
-            if head["index"] == self.index and head["frame"] == self.frame:
-                ImageLock.lock()
-                Image = img
-                ImageLock.unlock()
-                backend.imageReady.emit()
-                head["prev"] = None
-                break
-
-            head = head["prev"]
-        ImagesPendingLock.unlock()
-        
-    def update_Cache(self, img):
-        head = None
-        
-        CacheLocks[self.index].lockForWrite()
-        if self.frame in Caches[self.index]:
-            del Caches[self.index][self.frame]
-            Caches[self.index][self.frame] = img
+        DisplayLock.lock()
+        if self.generation > DisplayedGeneration:
+            DisplayedGeneration = self.generation
+            ImageLock.lock()
+            Image = img
+            ImageLock.unlock()
+            backend.imageReady.emit(level, x, y, full_width, full_height)
+            latency = time.perf_counter() - self.requested_at
+            DisplayLatencies.append(latency)
+            if Clips[self.index]:
+                recordStages(self.index, { "display": latency })
+            backend.statsText = self.stats_Text(latency)
+        DisplayLock.unlock()
+
+    def stats_Text(self, latency):
+        text = str(self.depth) + "-bit / Latency " + format(latency * 1000, ".1f") + " ms"
+        if self.cached:
+            text += " (cached)"
         else:
-            Caches[self.index][self.frame] = img
-            head = CacheHeads[self.index] = CacheHeads[self.index] + 1
-        CacheLocks[self.index].unlock()
-        
-        if head and head % CacheCleaningFrequency == 0:
-            CacheLocks[self.index].lockForWrite()
-            frame_list = list(Caches[self.index])
-            for jndex in range(0, len(frame_list) - CacheMinimumSize):
-                del Caches[self.index][frame_list[jndex]]
-            CacheLocks[self.index].unlock()
-
-class LoadImageOfNearbyIndex(QRunnable):
-    def __init__(self, index, frame):
+            text += " (" + ", ".join([stage.replace("_", " ") + " " + format(self.stages[stage] * 1000, ".1f") + " ms"
+                                      for stage in Stages if stage in self.stages]) + ")"
+        counts = DisplayCacheCounts[self.index]
+        if counts["hits"] + counts["misses"]:
+            text += " / Cache hit rate " + format(counts["hits"] / (counts["hits"] + counts["misses"]), ".0%")
+        return text
+
+def prefetchImages(index, frame, depth, level, tiles, frames, nearby=True):
+    global PrefetchGeneration
+
+    PrefetchLock.lock()
+    PrefetchGeneration += 1
+    generation = PrefetchGeneration
+    PrefetchLock.unlock()
+    dropStaleAsyncRequests()
+
+    def is_stale():
+        PrefetchLock.lock()
+        is_stale = generation != PrefetchGeneration
+        PrefetchLock.unlock()
+
+        return is_stale
+
+    # The same frame on every other index is loaded first, in the order
+    # they're reached by cycling with Space and right click forwards and
+    # backwards, followed by the frames ahead on the current index,
+    # nearest first
+    cycle = [jndex for jndex in itertools.chain(range(index + 1, 10), range(index)) if Clips[jndex]] if nearby else []
+    nearby_indices = []
+    for i in range((len(cycle) + 1) // 2):
+        nearby_indices.append(cycle[i])
+        if len(cycle) - 1 - i != i:
+            nearby_indices.append(cycle[len(cycle) - 1 - i])
+    requests = []
+    for jndex, jrame in itertools.chain([(jndex, frame) for jndex in nearby_indices],
+                                        [(index, jrame) for jrame in frames]):
+        if tiles is not None and \
+           Clips[jndex] and \
+           (visible_tiles := visibleTiles(tiles, Clips[jndex].width, Clips[jndex].height)) is not None:
+            requests.extend([AsyncRequest(jndex, jrame, 1, tile, is_stale, depth=requestDepth(jndex, depth)) for tile in visible_tiles])
+        else:
+            requests.append(AsyncRequest(jndex, jrame, level, None, is_stale, depth=requestDepth(jndex, depth)))
+    requestImagesAsync(requests, first=True)
+
+# The depth frames of index are loaded in when frames of the current index
+# are requested in depth. Indices in "auto" follow the current index, and
+# other indices use the depth of Clips.
+def requestDepth(index, depth):
+    if DepthPolicies[index] == "auto":
+        return depth
+    else:
+        return Depths[index]
+
+class WarmPreviewGroupProgress:
+    def __init__(self, total, clip_count, background_generation, warm_generation):
+        self.total = total
+        self.count = 0
+        self.clip_count = clip_count
+        self.background_generation = background_generation
+        self.warm_generation = warm_generation
+        self.lock = QMutex()
+
+    def is_stale(self):
+        BackgroundLock.lock()
+        is_stale = self.background_generation != BackgroundGeneration or \
+                   self.warm_generation != WarmGeneration
+        BackgroundLock.unlock()
+
+        return is_stale
+
+    def on_done(self, request):
+        self.lock.lock()
+        self.count += 1
+        count = self.count
+        self.lock.unlock()
+
+        if not self.is_stale():
+            if count < self.total:
+                backend.status = f"Warming preview group {count}/{self.total}"
+            else:
+                backend.status = ""
+                backend.message = f"Preview group warmed for {self.clip_count} clips"
+
+def saveImageOptions():
+    if "VSQV_SAVE_IMAGE_DIRECTORY" in os.environ:
+        path = Path(os.environ["VSQV_SAVE_IMAGE_DIRECTORY"]).expanduser()
+    else:
+        if len((path := QStandardPaths.standardLocations(QStandardPaths.PicturesLocation))) >= 1:
+            path = Path(path[0])
+        else:
+            path = Path("~/Pictures").expanduser()
+    if "VSQV_SAVE_IMAGE_FORMAT" in os.environ:
+        format = os.environ["VSQV_SAVE_IMAGE_FORMAT"]
+    else:
+        format = "PNG"
+    if "VSQV_SAVE_IMAGE_QUALITY" in os.environ:
+        quality = int(os.environ["VSQV_SAVE_IMAGE_QUALITY"])
+    else:
+        quality = 100
+    return path, format, quality
+
+def saveImagePath(path, index, name, frame, format):
+    if name is not None and name != "":
+        path = path.joinpath(f"{index}. {name} {frame}.{format.lower()}")
+    else:
+        path = path.joinpath(f"{index} {frame}.{format.lower()}")
+    return path.as_posix()
+
+# Images are saved in the background so that encoding doesn't block the
+# window. Every thread holds at most one frame at a time, which bounds the
+# memory used when exporting many frames.
+ImageWriterThreadPool = QThreadPool()
+ImageWriterThreadPool.setMaxThreadCount(max(1, min(4, QThread.idealThreadCount() // 2)))
+
+# Loads frame of index at full resolution and saves it to path. Frames
+# already in the cache are reused, but frames loaded for saving aren't
+# added to the cache so that they don't evict the frames being previewed.
+# source is the clip at index when the save is requested. If the clip has
+# been replaced since, nothing is saved.
+class SaveImage(QRunnable):
+    def __init__(self, index, frame, path, format, quality, source, is_stale=None, on_done=None):
         super().__init__()
 
         self.index = index
         self.frame = frame
-        
+        self.path = path
+        self.format = format
+        self.quality = quality
+        self.source = source
+        self.is_stale = is_stale
+        self.on_done = on_done
+
     def run(self):
-        CacheThreadPool.waitForDone()
-        ImagesPendingLock.lock()
-        if ImagesPending["frame"] == self.frame:
-            ImagesPendingLock.unlock()
-            if CacheThreadPoolLock.tryLockForRead():
-                for jndex in itertools.chain(range(self.index + 1, 10), range(self.index)):
-                    if Clips[jndex]:
-                        CacheThreadPool.start(RequestImage(jndex, self.frame, False), priority=2)
-                        break
-                CacheThreadPoolLock.unlock()
-                
-                CacheThreadPool.waitForDone()
-                ImagesPendingLock.lock()
-                if ImagesPending["frame"] == self.frame:
-                    ImagesPendingLock.unlock()
-                    if CacheThreadPoolLock.tryLockForRead():
-                        for jndex in itertools.chain(range(self.index - 1, -1, -1), range(10 - 1, self.index, -1)):
-                            if Clips[jndex]:
-                                CacheThreadPool.start(RequestImage(jndex, self.frame, False), priority=2)
-                                break
-                        CacheThreadPoolLock.unlock()
-                else:
-                    ImagesPendingLock.unlock()
+        try:
+            if not (self.is_stale and self.is_stale()):
+                self.save()
+        except Exception as e:
+            backend.message = str(traceback.format_exception(e, value=e, tb=None)[0]).splitlines()[0]
+        if self.on_done:
+            self.on_done(self)
+
+    # The lock is only held to look up the frame in the caches and to take
+    # the clip to render it from, since vsqv.View() and the GUI thread
+    # would otherwise wait for the frame to render
+    def save(self):
+        clip = None
+        CacheThreadPoolLock.lockForRead()
+        try:
+            if self.source is None:
+                img = ColourBars()
+            elif Sources[self.index] is not self.source or \
+                 not 0 <= self.frame < self.source.num_frames:
+                backend.message = f"Failed to save image to \"{self.path}\""
+                return
+            else:
+                depth = Depths[self.index]
+                if (img := Cache.get((ClipKeys[self.index], self.frame, depth, 1, None))) is None and \
+                   (img := loadDiskImage(self.index, self.frame, depth, 1, None)) is None:
+                    clip = Clips[self.index]
+                    clip_color_space = ClipColorSpaces[self.index]
+        finally:
+            CacheThreadPoolLock.unlock()
+
+        if clip is not None:
+            img = loadImage(self.index, clip, clip_color_space, self.frame)
+
+        if img.save(self.path, self.format, self.quality):
+            if not self.on_done:
+                backend.message = f"Image saved to \"{self.path}\""
         else:
-            ImagesPendingLock.unlock()
+            backend.message = f"Failed to save image to \"{self.path}\""
+
+# Difference between the clips at two indices, calculated on the luma of
+# the clips in 32-bit float. For "psnr", PlaneStats of the squared
+# difference gives the mean squared error. For "mae", PlaneStats gives the
+# mean absolute difference directly. Both are read from _PlaneStatsAverage
+# or _PlaneStatsDiff of the frames.
+DifferenceMetrics = ["psnr", "mae"]
+
+def differenceClip(a, b, metric):
+    def luma(clip):
+        if clip.format.color_family == vs.YUV:
+            clip = clip.std.ShufflePlanes(planes=0, colorfamily=vs.GRAY)
+            return clip.resize.Point(format=vs.GRAYS)
+        elif clip.format.color_family == vs.RGB:
+            return clip.resize.Point(format=vs.GRAYS, matrix_s="709")
+        else:
+            return clip.resize.Point(format=vs.GRAYS)
+    a = luma(a)
+    b = luma(b)
+    if (b.width, b.height) != (a.width, a.height):
+        b = b.resize.Bicubic(width=a.width, height=a.height)
+    length = min(a.num_frames, b.num_frames)
+    a = a[:length]
+    b = b[:length]
+
+    if metric == "psnr":
+        return core.std.Expr([a, b], "x y - dup *").std.PlaneStats()
+    else:
+        return a.std.PlaneStats(b)
+
+# Scans are fed into AsyncQueue a few frames at a time instead of all at
+# once, so that the queue stays short for prefetches and for
+# dropStaleAsyncRequests()
+class ScanDifferencesProgress:
+    def __init__(self, a, b, metric, count, clip, sources, background_generation, scan_generation):
+        self.a = a
+        self.b = b
+        self.metric = metric
+        self.count = count
+        self.clip = clip
+        self.sources = sources
+        self.background_generation = background_generation
+        self.scan_generation = scan_generation
+        self.total = clip.num_frames
+        # NaN for frames not yet scanned. For "psnr", the PSNR in dB, and
+        # for "mae", the mean absolute difference between 0 and 1.
+        self.scores = np.full(self.total, np.nan, dtype=np.float32)
+        self.next_frame = 0
+        self.done_count = 0
+        self.lock = QMutex()
+
+    def is_stale(self):
+        BackgroundLock.lock()
+        is_stale = self.background_generation != BackgroundGeneration or \
+                   self.scan_generation != ScanGeneration
+        BackgroundLock.unlock()
+
+        return is_stale or \
+               Sources[self.a] is not self.sources[0] or \
+               Sources[self.b] is not self.sources[1]
+
+    def request_more(self):
+        # Keeps twice FramesInFlightLimit frames queued or in flight
+        self.lock.lock()
+        start = self.next_frame
+        end = self.next_frame = max(min(self.done_count + max(FramesInFlightLimit, 1) * 2, self.total), start)
+        self.lock.unlock()
+
+        if end > start:
+            requestImagesAsync([AsyncRequest(self.a, frame, 1, None, self.is_stale, self.on_done, clip=self.clip, on_frame=self.on_frame)
+                                for frame in range(start, end)])
+
+    def on_frame(self, request, frame):
+        if self.metric == "psnr":
+            mse = frame.props["PlaneStatsAverage"]
+            self.scores[request.frame] = 10 * math.log10(1 / mse) if mse > 0 else np.inf
+        else:
+            self.scores[request.frame] = frame.props["PlaneStatsDiff"]
+
+    def on_done(self, request):
+        self.lock.lock()
+        self.done_count += 1
+        done_count = self.done_count
+        self.lock.unlock()
+
+        if self.is_stale():
+            if done_count == self.next_frame and LastScan is self:
+                backend.status = ""
+            return
+        if done_count < self.total:
+            if done_count % 100 == 0:
+                backend.status = f"Scanning differences {done_count}/{self.total}"
+            self.request_more()
+        else:
+            self.finish()
+
+    def finish(self):
+        scores = np.nan_to_num(self.scores, nan=np.inf if self.metric == "psnr" else -np.inf)
+        # The frames with the lowest PSNR or the highest MAE
+        order = np.argsort(scores if self.metric == "psnr" else -scores, kind="stable")[:min(self.count, self.total)]
+        backend.status = ""
+        SetPreviewGroup(order.tolist())
+        backend.message = f"Preview group set to the {len(order)} most different frames between index {self.a} and {self.b}"
+
+def thumbnailCount():
+    if "VSQV_THUMBNAILS" in os.environ:
+        try:
+            count = int(os.environ["VSQV_THUMBNAILS"])
+        except:
+            raise ValueError("Environment variable \"VSQV_THUMBNAILS\" was set but isn't an integer.")
+        if count < 0:
+            raise ValueError("Environment variable \"VSQV_THUMBNAILS\" is less than 0.")
+        return count
+    else:
+        return 256
+
+ThumbnailCount = thumbnailCount()
+# Thumbnails are downscaled by an integer factor to at least this height
+ThumbnailHeight = 72
+
+# Thumbnails are loaded through AsyncQueue behind every other request, with
+# at most ThumbnailsInFlight frames queued or in flight at a time so that
+# they never hold up frames requested by frontend.
+ThumbnailsInFlight = 2
+
+# Loads the thumbnails not yet loaded into thumbnails for the clip at
+# index. The job stops once the index previews another clip, and
+# startThumbnails() then continues with a new job from another index
+# previewing the same clip.
+class ThumbnailJob:
+    def __init__(self, index, clip_key, clip, thumbnails):
+        self.index = index
+        self.clip_key = clip_key
+        self.clip = clip
+        self.thumbnails = thumbnails
+        self.order = [i for i in thumbnails.order() if not thumbnails.loaded[i]]
+        self.next = 0
+        self.done_count = 0
+        self.lock = QMutex()
+
+    def is_stale(self):
+        return ClipKeys[self.index] != self.clip_key or \
+               ClipThumbnails.get(self.clip_key) is not self
+
+    def request_more(self):
+        self.lock.lock()
+        start = self.next
+        end = self.next = max(min(self.done_count + ThumbnailsInFlight, len(self.order)), start)
+        self.lock.unlock()
+
+        if end > start:
+            requestImagesAsync([AsyncRequest(self.index, int(self.thumbnails.frames[i]), 1, None, self.is_stale, self.on_done,
+                                             clip=self.clip, on_frame=lambda request, frame, i=i: self.on_frame(i, frame))
+                                for i in self.order[start:end]])
+
+    def on_frame(self, i, frame):
+        self.thumbnails.insert(i, np.stack([np.asarray(frame[plane]) for plane in range(frame.format.num_planes)], axis=-1))
+
+        # Frontend reloads the thumbnails every time the distance between
+        # loaded thumbnails halves, and every 32 thumbnails after
+        count = self.thumbnails.loaded_count()
+        if count & (count - 1) == 0 or count % 32 == 0 or count == self.thumbnails.count:
+            backend.thumbnailsVersion = backend.thumbnailsVersion + 1
+
+    def on_done(self, request):
+        self.lock.lock()
+        self.done_count += 1
+        self.lock.unlock()
+
+        if not self.is_stale():
+            self.request_more()
+
+# Starts loading the thumbnails of the clip at index in the background,
+# unless they're already loading or loaded. Called by frontend when the
+# timeline is shown, since it renders frames across the whole clip.
+# Clips with variable dimensions have no thumbnails.
+def startThumbnails(index):
+    source = Sources[index]
+    clip_key = ClipKeys[index]
+    if not ThumbnailCount or not source or \
+       source.width == 0 or source.height == 0:
+        return
+    if (job := ClipThumbnails.get(clip_key)) is not None and \
+       not job.is_stale():
+        return
+
+    clip = renderClip(index, 8, max(source.height // ThumbnailHeight, 1))
+    if job is None:
+        thumbnails = ThumbnailIndex(ThumbnailCount, source.num_frames, clip.width, clip.height, clip.format.num_planes)
+    else:
+        thumbnails = job.thumbnails
+    job = ClipThumbnails[clip_key] = ThumbnailJob(index, clip_key, clip, thumbnails)
+    job.request_more()
+
+class ExportPreviewGroupProgress:
+    def __init__(self, total, directory, background_generation):
+        self.total = total
+        self.count = 0
+        self.directory = directory
+        self.background_generation = background_generation
+        self.lock = QMutex()
+
+    def is_stale(self):
+        BackgroundLock.lock()
+        is_stale = self.background_generation != BackgroundGeneration
+        BackgroundLock.unlock()
+
+        return is_stale
+
+    def on_done(self, request):
+        self.lock.lock()
+        self.count += 1
+        count = self.count
+        self.lock.unlock()
+
+        if not self.is_stale():
+            if count < self.total:
+                backend.status = f"Exporting preview group {count}/{self.total}"
+            else:
+                backend.status = ""
+                backend.message = f"Preview group exported to \"{self.directory}\""
 
 class Backend(QObject):
     def __init__(self):
@@ -249,9 +1385,22 @@ class Backend(QObject):
 
         self.indexChanged.connect(self.updateImage)
         self.frameChanged.connect(self.updateImage)
+        self.levelChanged.connect(self.updateImage)
 
         self.indexChanged.connect(self.updateName)
 
+        # Started when an index in "auto" depth is displayed in 8-bit
+        self._restTimer = QTimer(self)
+        self._restTimer.setSingleShot(True)
+        self._restTimer.setInterval(AutoDepthRestDelay)
+        self._restTimer.timeout.connect(self.restImage)
+
+        # Advances the frame during playback, see togglePlayback()
+        self._playbackTimer = QTimer(self)
+        self._playbackTimer.setTimerType(Qt.PreciseTimer)
+        self._playbackTimer.timeout.connect(self.advancePlayback)
+        self.imageReady.connect(self.countPlaybackFrame)
+
     _index = 0
     def index_(self):
         return self._index
@@ -262,6 +1411,18 @@ class Backend(QObject):
     indexChanged = Signal()
     index = Property(int, index_, setIndex, notify=indexChanged)
 
+    # The factor frontend wants the image downscaled by, above 1 when the
+    # preview is zoomed out below 1:1
+    _level = 1
+    def level_(self):
+        return self._level
+    def setLevel(self, level):
+        if self._level != level:
+            self._level = level
+            self.levelChanged.emit()
+    levelChanged = Signal()
+    level = Property(int, level_, setLevel, notify=levelChanged)
+
     _frame = 0
     def frame_(self):
         return self._frame
@@ -274,26 +1435,171 @@ class Backend(QObject):
     
     @Slot()
     def updateImage(self):
-        global ImagesPending
-        global ImagesPendingCount
+        self.requestImage(False)
+    # Loads the current frame in 16-bit once frontend has rested on it
+    @Slot()
+    def restImage(self):
+        self.requestImage(True)
+    def requestImage(self, resting):
+        global DisplayGeneration
+
+        level = self.level if DownscalePreview else 1
+
+        self._restTimer.stop()
+        if DepthPolicies[self.index] == "auto" and not resting and \
+           not (self._tiles is None and Cache.contains((ClipKeys[self.index], self.frame, 16, level, None))):
+            depth = 8
+            self._restTimer.start()
+        else:
+            depth = None
         
         CacheThreadPoolLock.lockForRead()
-        request_image = RequestImage(self.index, self.frame, True)
-        ImagesPendingLock.lock()
+        DisplayLock.lock()
+        DisplayGeneration += 1
+        request_image = RequestImage(self.index, self.frame, depth, level, self._tiles, DisplayGeneration, time.perf_counter())
+        DisplayLock.unlock()
         if not CacheThreadPool.tryStart(request_image):
-            if ImagesPendingCount % 2 == 0:
-                CacheThreadPool.clear()
-                CacheThreadPool.start(request_image, priority=5)
-            else:
-                CacheThreadPool.start(request_image, priority=4)
+            CacheThreadPool.clear()
+            CacheThreadPool.start(request_image, priority=5)
         CacheThreadPoolLock.unlock()
-        ImagesPending = { "index": self.index, "frame": self.frame, "prev": ImagesPending }
-        ImagesPendingCount += 1
-        ImagesPendingLock.unlock()
-        LoadImageOfNearbyIndexThreadPool.clear()
-        LoadImageOfNearbyIndexThreadPool.start(LoadImageOfNearbyIndex(self.index, self.frame))
-    imageReady = Signal()
+        prefetchImages(self.index, self.frame, depth or Depths[self.index], level, self._tiles, self.prefetchFrames(), not self.playing)
+    # The arguments are the level the image is downscaled by, the offset of
+    # the image in the frame, and the width and height of the whole frame
+    imageReady = Signal(int, int, int, int, int)
+
+    # The range of tiles (tx0, ty0, tx1, ty1) visible in frontend, or None if
+    # the zoom level is below TileZoom and the whole frame is loaded
+    _tiles = None
+    @Slot(int, int, int, int, float)
+    def setViewport(self, x, y, width, height, scale):
+        if TileZoom and scale >= TileZoom and width > 0 and height > 0:
+            tiles = (max(x, 0) // TileSize, max(y, 0) // TileSize, (x + width - 1) // TileSize + 1, (y + height - 1) // TileSize + 1)
+        else:
+            tiles = None
+
+        if self._tiles != tiles:
+            self._tiles = tiles
+            self.updateImage()
+
+    # The stride of the last navigation, negative if stepping backwards or 0
+    # if the last navigation was a jump. Used to decide which frames to
+    # prefetch.
+    _step = 0
+    _step_in_preview_group = False
+    def setStep(self, step, in_preview_group=False):
+        self._step = step
+        self._step_in_preview_group = in_preview_group
+
+    def prefetchFrames(self):
+        if not self._step or \
+           not Clips[self.index] or \
+           not 0 <= self.frame < Clips[self.index].num_frames:
+            return []
+
+        if self._step_in_preview_group:
+            if self._step > 0:
+                start = bisect.bisect_right(self.preview_group, self.frame)
+                frames = self.preview_group[start:start + PrefetchCount]
+            else:
+                end = bisect.bisect_left(self.preview_group, self.frame)
+                frames = self.preview_group[max(end - PrefetchCount, 0):end][::-1]
+        elif self.playing:
+            frames = range(self.frame + 1, self.frame + 1 + max(PrefetchCount, math.ceil(self._playback_fps * PlaybackPrefetchSeconds)))
+        else:
+            frames = range(self.frame + self._step, self.frame + self._step * (PrefetchCount + 1), self._step)
+
+        return [frame for frame in frames if 0 <= frame < Clips[self.index].num_frames]
     
+    # Playback advances the frame by the time passed at the fps of the clip
+    # on the current index. If the frames can't be loaded in time, the
+    # frames in between are dropped instead of slowing down playback.
+    _playing = False
+    def playing_(self):
+        return self._playing
+    def setPlaying(self, playing):
+        if self._playing != playing:
+            self._playing = playing
+            self.playingChanged.emit()
+    playingChanged = Signal()
+    playing = Property(bool, playing_, setPlaying, notify=playingChanged)
+
+    # Called by frontend whenever the timeline is shown
+    @Slot()
+    def loadThumbnails(self):
+        startThumbnails(self.index)
+
+    @Slot()
+    def togglePlayback(self):
+        if self.playing:
+            self._playbackTimer.stop()
+            self.playing = False
+            self.playbackText = ""
+            self.setStep(0)
+        elif Clips[self.index] and 0 <= self.frame < Clips[self.index].num_frames - 1:
+            self.setStep(1)
+            self._playback_fps = 0
+            self._playback_frame = None
+            # Times frames are displayed in the last second, and the numbers
+            # of frames played and displayed
+            self._playback_displayed = collections.deque()
+            self._playback_played = 0
+            self._playback_shown = 0
+            self._playback_text_at = 0
+            self.playing = True
+            self.advancePlayback()
+            self._playbackTimer.start()
+
+    @Slot()
+    def advancePlayback(self):
+        clip = Clips[self.index]
+        if not clip or not 0 <= self.frame < clip.num_frames:
+            self.togglePlayback()
+            return
+
+        now = time.perf_counter()
+        fps = float(clip.fps) if clip.fps_num and clip.fps_den else PlaybackDefaultFps
+        # Restarts counting from the current frame if playback has just
+        # started, the clip on the current index has a different fps, or
+        # the frame has been changed by other means
+        if fps != self._playback_fps or self.frame != self._playback_frame:
+            self._playback_fps = fps
+            self._playback_start = (now, self.frame)
+            self._playbackTimer.setInterval(max(int(500 / fps), 1))
+            self._playback_frame = self.frame
+            return
+
+        frame = min(self._playback_start[1] + int((now - self._playback_start[0]) * fps), clip.num_frames - 1)
+        if frame != self._playback_frame:
+            self._playback_played += frame - self._playback_frame
+            self._playback_frame = frame
+            self.frame = frame
+
+        if now - self._playback_text_at >= 0.5:
+            self._playback_text_at = now
+            while self._playback_displayed and self._playback_displayed[0] < now - 1:
+                self._playback_displayed.popleft()
+            self.playbackText = "Playing " + format(len(self._playback_displayed), ".0f") + "/" + format(fps, ".3g") + " fps / " + \
+                                str(max(self._playback_played - self._playback_shown, 0)) + " frames dropped"
+
+        if frame == clip.num_frames - 1:
+            self.togglePlayback()
+
+    @Slot(int, int, int, int, int)
+    def countPlaybackFrame(self, *_):
+        if self.playing:
+            self._playback_displayed.append(time.perf_counter())
+            self._playback_shown += 1
+
+    _playbackText = ""
+    def playbackText_(self):
+        return self._playbackText
+    def setPlaybackText(self, text):
+        if self._playbackText != text:
+            self._playbackText = text
+            self.playbackTextChanged.emit()
+    playbackTextChanged = Signal()
+    playbackText = Property(str, playbackText_, setPlaybackText, notify=playbackTextChanged)
+
     _name = ""
     def name_(self):
         return self._name
@@ -354,6 +1660,7 @@ class Backend(QObject):
 
     @Slot()
     def prevFrame(self):
+        self.setStep(-1)
         if Clips[self.index] and 0 <= self.frame < Clips[self.index].num_frames:
             if self.frame > 0:
                 self.frame = self.frame - 1
@@ -363,6 +1670,7 @@ class Backend(QObject):
             self.frame = self.frame - 1
     @Slot()
     def prevTwelveFrames(self):
+        self.setStep(-12)
         if Clips[self.index] and 0 <= self.frame < Clips[self.index].num_frames:
             if self.frame >= 12:
                 self.frame = self.frame - 12
@@ -374,11 +1682,13 @@ class Backend(QObject):
     def prevPreviewGroupFrame(self):
         if self.preview_group:
             if self.frame > self.preview_group[0]:
+                self.setStep(-1, True)
                 self.frame = self.preview_group[bisect.bisect_left(self.preview_group, self.frame) - 1]
         else:
             self.prevFrame()
     @Slot()
     def nextFrame(self):
+        self.setStep(1)
         if Clips[self.index] and 0 <= self.frame < Clips[self.index].num_frames:
             if self.frame < Clips[self.index].num_frames - 1:
                 self.frame = self.frame + 1
@@ -388,6 +1698,7 @@ class Backend(QObject):
             self.frame = self.frame + 1
     @Slot()
     def nextTwelveFrames(self):
+        self.setStep(12)
         if Clips[self.index] and 0 <= self.frame < Clips[self.index].num_frames:
             if self.frame < Clips[self.index].num_frames - 12:
                 self.frame = self.frame + 12
@@ -399,22 +1710,42 @@ class Backend(QObject):
     def nextPreviewGroupFrame(self):
         if self.preview_group:
             if self.frame < self.preview_group[-1]:
+                self.setStep(1, True)
                 self.frame = self.preview_group[bisect.bisect_left(self.preview_group, self.frame + 1)]
         else:
             self.nextFrame()
     @Slot(int)
     def switchFrame(self, frame):
+        self.setStep(0)
         self.frame = frame
     @Slot()
     def clipboardToFrame(self):
         try:
-            self.frame = int(app.clipboard().text().strip())
+            frame = int(app.clipboard().text().strip())
+            self.setStep(0)
+            self.frame = frame
         except ValueError:
             pass
     @Slot()
     def frameToClipboard(self):
         app.clipboard().setText(str(self.frame))
     
+    # Increased whenever more thumbnails are loaded, see ThumbnailJob
+    _thumbnailsVersion = 0
+    def thumbnailsVersion_(self):
+        return self._thumbnailsVersion
+    def setThumbnailsVersion(self, version):
+        if self._thumbnailsVersion != version:
+            self._thumbnailsVersion = version
+            self.thumbnailsVersionChanged.emit()
+    thumbnailsVersionChanged = Signal()
+    thumbnailsVersion = Property(int, thumbnailsVersion_, setThumbnailsVersion, notify=thumbnailsVersionChanged)
+
+    # The number of frames of the clip on the current index, or 0
+    def frameCount_(self):
+        return Clips[self.index].num_frames if Clips[self.index] else 0
+    frameCount = Property(int, frameCount_, notify=indexChanged)
+
     @Slot(result=bool)
     def frameInPreviewGroup(self):
         return self.frame in self.preview_group
@@ -440,46 +1771,39 @@ class Backend(QObject):
     message = Property(str, message_, setMessage, notify=messageChanged)
     newMessage = Signal()
 
+    # Progress of the running background job, or "" if there isn't one
+    _status = ""
+    def status_(self):
+        return self._status
+    def setStatus(self, status):
+        if self._status != status:
+            self._status = status
+            self.statusChanged.emit()
+    statusChanged = Signal()
+    status = Property(str, status_, setStatus, notify=statusChanged)
+
+    # Timings of the last displayed frame, for the stats overlay
+    _statsText = ""
+    def statsText_(self):
+        return self._statsText
+    def setStatsText(self, stats_text):
+        if self._statsText != stats_text:
+            self._statsText = stats_text
+            self.statsTextChanged.emit()
+    statsTextChanged = Signal()
+    statsText = Property(str, statsText_, setStatsText, notify=statsTextChanged)
+
     @Slot()
     def saveImage(self):
-        index = self.index
-        frame = self.frame
-        name = self.name
-
-        CacheThreadPoolLock.lockForWrite()
         try:
-            if "VSQV_SAVE_IMAGE_DIRECTORY" in os.environ:
-                path = Path(os.environ["VSQV_SAVE_IMAGE_DIRECTORY"]).expanduser()
-            else:
-                if len((path := QStandardPaths.standardLocations(QStandardPaths.PicturesLocation))) >= 1:
-                    path = Path(path[0])
-                else:
-                    path = Path("~/Pictures").expanduser()
-            if "VSQV_SAVE_IMAGE_FORMAT" in os.environ:
-                format = os.environ["VSQV_SAVE_IMAGE_FORMAT"]
-            else:
-                format = "PNG"
-            if name is not None and name != "":
-                path = path.joinpath(f"{index}. {name} {frame}.{format.lower()}")
-            else:
-                path = path.joinpath(f"{index} {frame}.{format.lower()}")
-            path = path.as_posix()
-            if "VSQV_SAVE_IMAGE_QUALITY" in os.environ:
-                quality = int(os.environ["VSQV_SAVE_IMAGE_QUALITY"])
-            else:
-                quality = 100
-        
-            CacheThreadPool.waitForDone()
-
-            ImageLock.lock()
-            if Image.save(path, format, quality):
-                self.message = f"Image saved to \"{path}\""
-            else:
-                self.message = f"Failed to save image to \"{path}\""
-            ImageLock.unlock()
+            path, format, quality = saveImageOptions()
+            path = saveImagePath(path, self.index, self.name, self.frame, format)
         except Exception as e:
             self.message = str(traceback.format_exception(e, value=e, tb=None)[0]).splitlines()[0]
-        CacheThreadPoolLock.unlock()
+            return
+
+        self.message = f"Saving image to \"{path}\""
+        ImageWriterThreadPool.start(SaveImage(self.index, self.frame, path, format, quality, Sources[self.index]))
 
 class WindowControl(QObject):
     def __init__(self):
@@ -494,14 +1818,22 @@ os.environ["QT_QUICK_CONTROLS_MATERIAL_THEME"] = "Dark"
 
 # Options
 # os.environ["VSQV_FORCE_8_BIT"]
+# os.environ["VSQV_CACHE_MB"]
+# os.environ["VSQV_CACHE_MMAP_DIRECTORY"]
+# os.environ["VSQV_PREFETCH_FRAMES"]
+# os.environ["VSQV_FRAMES_IN_FLIGHT"]
+# os.environ["VSQV_DOWNSCALE_PREVIEW"]
+# os.environ["VSQV_TILE_ZOOM"]
+# os.environ["VSQV_DISK_CACHE_DIRECTORY"]
+# os.environ["VSQV_DISK_CACHE_MB"]
+# os.environ["VSQV_THUMBNAILS"]
 # os.environ["VSQV_SCREEN_DEVICE_PIXEL_RATIO"]
 
+start = time.perf_counter()
 if not (app := QGuiApplication.instance()):
     app = QGuiApplication([])
-engine = QQmlApplicationEngine()
+StartupTimes["application"] = time.perf_counter() - start
 
-image_provider = ImageProvider()
-engine.addImageProvider("backend", ImageProvider())
 backend = Backend()
 if "VSQV_SCREEN_DEVICE_PIXEL_RATIO" in os.environ:
     try:
@@ -512,48 +1844,167 @@ if "VSQV_SCREEN_DEVICE_PIXEL_RATIO" in os.environ:
         raise ValueError("Environment variable \"VSQV_SCREEN_DEVICE_PIXEL_RATIO\" was set but is not a number.")
     if backend._devicePixelRatioOverride < 0.0:
         raise ValueError("Environment variable \"VSQV_SCREEN_DEVICE_PIXEL_RATIO\" is less than 0.")
-engine.rootContext().setContextProperty("backend", backend)
 window_control = WindowControl()
-engine.rootContext().setContextProperty("windowcontrol", window_control)
-
-qml_file = Path(__file__).with_name("vsquickview.qml").as_posix()
-engine.load(qml_file)
 
+# The QML engine and the window are only created on the first vsqv.View()
+# or vsqv.Show() so that importing vsquickview stays cheap.
+engine = None
+image_provider = None
+thumbnail_provider = None
+
+def startEngine():
+    global engine
+    global image_provider
+    global thumbnail_provider
+
+    if engine is not None:
+        return
+
+    start = time.perf_counter()
+    engine = QQmlApplicationEngine()
+    image_provider = ImageProvider()
+    engine.addImageProvider("backend", image_provider)
+    thumbnail_provider = ThumbnailProvider()
+    engine.addImageProvider("thumbnails", thumbnail_provider)
+    engine.rootContext().setContextProperty("backend", backend)
+    engine.rootContext().setContextProperty("windowcontrol", window_control)
+    StartupTimes["engine"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    qml_file = Path(__file__).with_name("vsquickview.qml").as_posix()
+    engine.load(qml_file)
+    StartupTimes["qml"] = time.perf_counter() - start
+
+    # Frontend learns the size of the current frame from imageReady
+    backend.updateImage()
+
+StartupTimes["import"] = time.perf_counter() - ImportStart
+
+
+# The conversion from color_space_in to color_space, done in VapourSynth as
+# part of the clip instead of on every frame in QImage. It's split into
+# decoding the transfer of color_space_in using a LUT, converting between
+# the primaries and white points using a matrix on linear light, encoding
+# it with the sRGB transfer, and finally converting it to the transfer of
+# color_space using another LUT. The LUTs and the matrix are calculated
+# once by Qt itself, which is why the result matches
+# QImage.convertToColorSpace().
+class ColorTransform:
+    def __init__(self, color_space_in, color_space):
+        self.color_space_in = color_space_in
+        self.color_space = color_space
+
+        # Output channels by input channels
+        self.matrix = convertColors(np.identity(3, dtype=np.float32),
+                                    color_space_in.withTransferFunction(QColorSpace.TransferFunction.Linear),
+                                    color_space.withTransferFunction(QColorSpace.TransferFunction.Linear)).T
+
+        # { bits: (decode, encode) }, see luts()
+        self._luts = {}
+        self.lock = QMutex()
+
+    # Returns (decode, encode) for clips of bits. decode is [[r, g, b]] in
+    # linear light for every code value. encode is [[r, g, b]] code values
+    # of color_space for every 16-bit code value in sRGB transfer, or None
+    # if color_space uses the sRGB transfer.
+    def luts(self, bits):
+        self.lock.lock()
+        if bits not in self._luts:
+            decode = convertColors(np.repeat(np.linspace(0.0, 1.0, 2 ** bits, dtype=np.float32)[:, np.newaxis], 3, axis=1),
+                                   self.color_space_in, self.color_space_in.withTransferFunction(QColorSpace.TransferFunction.Linear))
+            if self.color_space.transferFunction() == QColorSpace.TransferFunction.SRgb:
+                encode = None
+            else:
+                encode = convertColors(np.repeat(np.linspace(0.0, 1.0, 65536, dtype=np.float32)[:, np.newaxis], 3, axis=1),
+                                       self.color_space.withTransferFunction(QColorSpace.TransferFunction.SRgb), self.color_space)
+                encode = np.rint(np.clip(encode, 0.0, 1.0) * (2 ** bits - 1)).astype(np.int64)
+            self._luts[bits] = (decode, encode)
+        luts = self._luts[bits]
+        self.lock.unlock()
+
+        return luts
+
+# Converts [[r, g, b]] from color_space_in to color_space in floating
+# point, without clamping values outside of color_space.
+def convertColors(colors, color_space_in, color_space):
+    image = np.empty((1, colors.shape[0], 4), dtype=np.float32)
+    image[0, :, :3] = colors
+    image[0, :, 3] = 1.0
+    qimage = QImage(image.data, colors.shape[0], 1, image.strides[0], QImage.Format.Format_RGBA32FPx4)
+    qimage.setColorSpace(color_space_in)
+    qimage = qimage.convertedToColorSpace(color_space)
+
+    return np.frombuffer(qimage.constBits(), dtype=np.float32, count=colors.shape[0] * 4).reshape(-1, 4)[:, :3].copy()
+
+# Returns the ColorTransform for a clip converted by convertClip(), or None
+# if there is nothing to convert or the conversion has to be left to
+# QImage. This is the case for vs.GRAY clips, for ICC profiles that
+# aren't made of a matrix and transfer functions, and for HDR transfers,
+# where QImage.convertToColorSpace() also tone maps. It's also left to
+# QImage before Qt 6.8, which lacks QColorSpace.transformModel() to tell
+# these cases apart.
+def colorTransform(clip, color_space_in, color_space):
+    if color_space_in == color_space or \
+       clip.format.color_family != vs.RGB or \
+       not hasattr(QColorSpace, "transformModel"):
+        return None
+    for space in [color_space_in, color_space]:
+        if space.transformModel() != QColorSpace.TransformModel.ThreeComponentMatrix or \
+           space.transferFunction() in [QColorSpace.TransferFunction.St2084, QColorSpace.TransferFunction.Hlg]:
+            return None
+
+    return ColorTransform(color_space_in, color_space)
+
+def View(clip: vs.VideoNode, index: int, name: Optional[str]=None, color_space_in: QColorSpace=QColorSpace(QColorSpace.SRgb), color_space: QColorSpace=QColorSpace(QColorSpace.SRgb), cache_key: Optional[str]=None, conversion: str="accurate", depth: Union[int, str, None]=None) -> None:
+    setView(clip, clip[:], index, name, color_space_in, color_space, cache_key, conversion, depth)
+
+# Previews the output of a VapourSynth script rendered in a separate
+# process, see RenderWorker. Frames are converted and packed in the worker
+# and passed back through shared memory, so filters neither compete with
+# the Python process for the GIL nor take it down if they crash. The other
+# arguments are the same as vsqv.View().
+def ViewScript(script: str, index: int, name: Optional[str]=None, color_space_in: QColorSpace=QColorSpace(QColorSpace.SRgb), color_space: QColorSpace=QColorSpace(QColorSpace.SRgb), output: int=0, cache_key: Optional[str]=None, conversion: str="accurate", depth: Union[int, str, None]=None) -> None:
+    assert(isinstance(script, (str, os.PathLike)))
+    assert(type(output) == int)
+
+    script = Path(script).expanduser().resolve().as_posix()
+    def on_exit(worker):
+        backend.message = f"Render worker for \"{worker.script}\" exited"
+    worker = RenderWorker(script, output, allocateImage, on_exit)
+    try:
+        source = RemoteClip(worker)
+        setView(source, source, index, name, color_space_in, color_space, cache_key, conversion, depth)
+    except:
+        worker.close()
+        raise
+
+# Closes the render workers of sources that are no longer previewed
+def closeWorkers(sources):
+    for source in sources:
+        if isinstance(source, RemoteClip) and \
+           not any(isinstance(other, RemoteClip) and other.worker is source.worker for other in Sources):
+            source.worker.close()
+
+def setView(node, source, index, name, color_space_in, color_space, cache_key, conversion, depth):
+    global PrefetchCount
+    global FramesInFlightLimit
+    global DownscalePreview
+    global TileZoom
+    global FrameDiskCache
+    global ThumbnailCount
 
-def View(clip: vs.VideoNode, index: int, name: Optional[str]=None, color_space_in: QColorSpace=QColorSpace(QColorSpace.SRgb), color_space: QColorSpace=QColorSpace(QColorSpace.SRgb)) -> None:
     assert(type(index) == int and 0 <= index < 10)
     assert(isinstance(name, typing.get_args(Optional[str])))
+    assert(isinstance(cache_key, typing.get_args(Optional[str])))
+    assert(conversion in ["accurate", "fast"])
+    assert(depth in [None, 8, 16, "auto"])
 
-    clip = clip[:]
-    if "VSQV_FORCE_8_BIT" not in os.environ:
-        if clip.format.color_family == vs.YUV:
-            clip = clip.resize.Spline36(format=vs.RGB48, matrix_in=vs.MATRIX_BT709, matrix=vs.MATRIX_RGB, transfer_in=vs.TRANSFER_BT709, transfer=13, dither_type="none")
-        elif clip.format.color_family == vs.RGB:
-            if clip.format.bits_per_sample == 8:
-                pass
-            elif clip.format.bits_per_sample == 16:
-                pass
-            else:
-                clip = clip.resize.Spline36(format=vs.RGB48, dither_type="none")
-        elif clip.format.color_family == vs.GRAY:
-            if clip.format.bits_per_sample == 8:
-                pass
-            elif clip.format.bits_per_sample == 16:
-                pass
-            else:
-                clip = clip.resize.Spline36(format=vs.GRAY16, dither_type="none")
-        else:
-            raise TypeError("Unsupported clip.format.color_family. vsquickview only supports vs.RGB, vs.YUV or vs.GRAY. To add support for other formats, raise an issue or make a pull request at https://github.com/Akatmks/vsquickview .")
-
-    else: # "VSQV_FORCE_8_BIT" in os.environ
-        if clip.format.color_family == vs.YUV:
-            clip = clip.resize.Spline36(format=vs.RGB24, matrix_in=vs.MATRIX_BT709, matrix=vs.MATRIX_RGB, transfer_in=vs.TRANSFER_BT709, transfer=13, dither_type="none")
-        elif clip.format.color_family == vs.RGB:
-            clip = clip.resize.Spline36(format=vs.RGB24, dither_type="none")
-        elif clip.format.color_family == vs.GRAY:
-            clip = clip.resize.Spline36(format=vs.GRAY8, dither_type="none")
-        else:
-            raise TypeError("Unsupported clip.format.color_family. vsquickview only supports vs.RGB, vs.YUV or vs.GRAY. To add support for other formats, raise an issue or make a pull request at https://github.com/Akatmks/vsquickview .")
+    depth_policy = depth if depth is not None else defaultDepth()
+    depth = 8 if depth_policy == 8 else 16
+    clip = buildClip(source, depth, 1, None, conversion)
+    color_transform = colorTransform(clip, color_space_in, color_space)
+    if color_transform is not None:
+        clip = buildClip(source, depth, 1, None, conversion, color_transform)
 
     if "VSQV_SCREEN_DEVICE_PIXEL_RATIO" in os.environ:
         try:
@@ -565,17 +2016,54 @@ def View(clip: vs.VideoNode, index: int, name: Optional[str]=None, color_space_i
         if device_pixel_ratio_override < 0.0:
             raise ValueError("Environment variable \"VSQV_SCREEN_DEVICE_PIXEL_RATIO\" is less than 0.")
         backend.devicePixelRatioOverride = device_pixel_ratio_override
-
-    Clips[index] = clip
-    ClipColorSpaces[index] = (color_space_in, color_space)
-    Names[index] = name
+    Cache.resize(cacheSize())
+    DownscalePreview = downscalePreview()
+    TileZoom = tileZoom()
+    FrameDiskCache = diskCache()
+    updateCacheMmapArena()
+    clip_key = clipKey(node, source, cache_key, color_space_in, color_space, conversion)
+    disk_key = clip_key[0] if FrameDiskCache is not None and isinstance(clip_key[0], str) else None
+    startEngine()
+    PrefetchCount = prefetchCount()
+    AsyncLock.lock()
+    FramesInFlightLimit = framesInFlightLimit()
+    AsyncLock.unlock()
+
+    if color_transform is not None:
+        clip_color_space = (color_space, color_space, None)
+    elif color_space_in != color_space:
+        clip_color_space = (color_space_in, color_space, color_space_in.transformationToColorSpace(color_space))
+    else:
+        clip_color_space = (color_space_in, color_space, None)
+
+    # Frames being loaded for the previous clip are finished first so
+    # that they're neither displayed nor saved to disk for the new clip
     CacheThreadPoolLock.lockForWrite()
     CacheThreadPool.waitForDone()
-    CacheLocks[index].lockForWrite()
-    Caches[index] = {}
-    CacheHeads[index] = 0
-    CacheLocks[index].unlock()
+    AsyncLock.lock()
+    RenderClipsLock.lock()
+    previous = Sources[index]
+    Sources[index] = source
+    DepthPolicies[index] = depth_policy
+    Depths[index] = depth
+    Conversions[index] = conversion
+    Clips[index] = clip
+    RenderClips[index] = {}
+    ClipColorTransforms[index] = color_transform
+    RenderClipsLock.unlock()
+    ClipColorSpaces[index] = clip_color_space
+    ClipDiskKeys[index] = disk_key
+    previous_key = ClipKeys[index]
+    ClipKeys[index] = clip_key
+    Names[index] = name
+    StageTimes[index] = { stage: collections.deque(maxlen=1000) for stage in Stages }
+    DisplayCacheCounts[index] = { "hits": 0, "misses": 0 }
+    releaseClipKey(previous_key)
+    AsyncLock.unlock()
     CacheThreadPoolLock.unlock()
+    closeWorkers([previous])
+
+    ThumbnailCount = thumbnailCount()
 
     backend.indexChanged.emit()
 
@@ -584,15 +2072,91 @@ def RemoveView(clip: Union[vs.VideoNode, int, None]=None, index: Optional[int]=N
         index = clip
     assert(type(index) == int and 0 <= index < 10)
 
+    CacheThreadPoolLock.lockForWrite()
+    CacheThreadPool.waitForDone()
+    AsyncLock.lock()
+    RenderClipsLock.lock()
+    previous = Sources[index]
+    Sources[index] = None
+    DepthPolicies[index] = None
+    Depths[index] = None
+    Conversions[index] = None
     Clips[index] = None
+    RenderClips[index] = {}
+    ClipColorTransforms[index] = None
+    RenderClipsLock.unlock()
     ClipColorSpaces[index] = None
+    ClipDiskKeys[index] = None
+    previous_key = ClipKeys[index]
+    ClipKeys[index] = None
     Names[index] = None
+    StageTimes[index] = { stage: collections.deque(maxlen=1000) for stage in Stages }
+    DisplayCacheCounts[index] = { "hits": 0, "misses": 0 }
+    releaseClipKey(previous_key)
+    AsyncLock.unlock()
+    CacheThreadPoolLock.unlock()
+    closeWorkers([previous])
+
+    if backend.index == index:
+        backend.indexChanged.emit()
+
+# Switches the clip at index between "accurate" and "fast" conversion, for
+# example to scrub through the clip in "fast" and compare frames in
+# "accurate".
+def SetConversion(clip: Union[vs.VideoNode, int, None]=None, index: Optional[int]=None, conversion: str="accurate") -> None:
+    if index == None:
+        index = clip
+    assert(type(index) == int and 0 <= index < 10)
+    assert(conversion in ["accurate", "fast"])
+
+    if not Sources[index] or Conversions[index] == conversion:
+        return
+    clip = buildClip(Sources[index], Depths[index], 1, None, conversion, ClipColorTransforms[index])
+
     CacheThreadPoolLock.lockForWrite()
     CacheThreadPool.waitForDone()
-    CacheLocks[index].lockForWrite()
-    Caches[index] = {}
-    CacheHeads[index] = 0
-    CacheLocks[index].unlock()
+    AsyncLock.lock()
+    RenderClipsLock.lock()
+    Conversions[index] = conversion
+    Clips[index] = clip
+    RenderClips[index] = {}
+    RenderClipsLock.unlock()
+    previous_key = ClipKeys[index]
+    ClipKeys[index] = (previous_key[0], conversion)
+    releaseClipKey(previous_key)
+    AsyncLock.unlock()
+    CacheThreadPoolLock.unlock()
+
+    if backend.index == index:
+        backend.indexChanged.emit()
+
+# Switches the clip at index between previewing in 16-bit, 8-bit, or
+# "auto", which loads frames in 8-bit while moving between frames and in
+# 16-bit once resting on a frame. Frames are cached per depth, so frames
+# already loaded in the other depth are kept.
+def SetDepth(clip: Union[vs.VideoNode, int, None]=None, index: Optional[int]=None, depth: Union[int, str]=16) -> None:
+    if index == None:
+        index = clip
+    assert(type(index) == int and 0 <= index < 10)
+    assert(depth in [8, 16, "auto"])
+
+    if not Sources[index] or DepthPolicies[index] == depth:
+        return
+    clip_depth = 8 if depth == 8 else 16
+    if clip_depth != Depths[index]:
+        clip = renderClip(index, clip_depth, 1)
+    else:
+        clip = Clips[index]
+
+    CacheThreadPoolLock.lockForWrite()
+    CacheThreadPool.waitForDone()
+    AsyncLock.lock()
+    RenderClipsLock.lock()
+    DepthPolicies[index] = depth
+    Depths[index] = clip_depth
+    Clips[index] = clip
+    RenderClipsLock.unlock()
+    AsyncLock.unlock()
     CacheThreadPoolLock.unlock()
 
     if backend.index == index:
@@ -610,7 +2174,7 @@ def SetIndex(clip: Union[vs.VideoNode, int, None]=None, index: Optional[int]=Non
     assert(type(index) == int and 0 <= index < 10)
 
     backend.switchIndex(index)
-def SetPreviewGroup(clip: Union[vs.VideoNode, list[int], None]=None, group: Optional[list[int]]=None) -> None:
+def SetPreviewGroup(clip: Union[vs.VideoNode, list[int], None]=None, group: Optional[list[int]]=None, warm: bool=False) -> None:
     if group == None:
         group = clip
 
@@ -621,14 +2185,152 @@ def SetPreviewGroup(clip: Union[vs.VideoNode, list[int], None]=None, group: Opti
     backend.preview_group = group
 
     backend.previewGroupChanged.emit()
+
+    if warm:
+        WarmPreviewGroup()
 def ClearPreviewGroup(clip: Optional[vs.VideoNode]=None) -> None:
+    global WarmGeneration
+
     backend.preview_group = []
+
+    BackgroundLock.lock()
+    WarmGeneration += 1
+    BackgroundLock.unlock()
+    dropStaleAsyncRequests()
+    backend.status = ""
     
     backend.previewGroupChanged.emit()
+def WarmPreviewGroup(clip: Optional[vs.VideoNode]=None) -> None:
+    global WarmGeneration
+
+    BackgroundLock.lock()
+    WarmGeneration += 1
+    warm_generation = WarmGeneration
+    background_generation = BackgroundGeneration
+    BackgroundLock.unlock()
+    dropStaleAsyncRequests()
+
+    group = list(backend.preview_group)
+    indices = [index for index in range(10) if Clips[index]]
+    if not group or not indices:
+        backend.status = ""
+        return
+
+    level = backend.level if DownscalePreview else 1
+    progress = WarmPreviewGroupProgress(len(group) * len(indices), len(indices), background_generation, warm_generation)
+    backend.status = f"Warming preview group 0/{progress.total}"
+    requestImagesAsync([AsyncRequest(index, frame, level, None, progress.is_stale, progress.on_done) for frame in group for index in indices])
+# Saves every frame in the preview group for every index with a clip, or
+# for indices, at full resolution to directory, with the file names and
+# format of saving an image with S. The default directory is that of
+# saving an image. Cancelled by vsqv.Cancel().
+def ExportPreviewGroup(clip: Optional[vs.VideoNode]=None, directory: Optional[str]=None, indices: Optional[list[int]]=None) -> None:
+    group = list(backend.preview_group)
+    if indices is None:
+        indices = [index for index in range(10) if Clips[index]]
+    assert(all([type(index) == int and 0 <= index < 10 and Clips[index] for index in indices]))
+    if not group or not indices:
+        return
+
+    path, format, quality = saveImageOptions()
+    if directory is not None:
+        path = Path(directory).expanduser()
+    path.mkdir(parents=True, exist_ok=True)
+
+    BackgroundLock.lock()
+    background_generation = BackgroundGeneration
+    BackgroundLock.unlock()
+
+    progress = ExportPreviewGroupProgress(len(group) * len(indices), path.as_posix(), background_generation)
+    backend.status = f"Exporting preview group 0/{progress.total}"
+    for frame in group:
+        for index in indices:
+            ImageWriterThreadPool.start(SaveImage(index, frame, saveImagePath(path, index, Names[index], frame, format), format, quality, Sources[index],
+                                                  progress.is_stale, progress.on_done))
+# Calculates the difference between the clips at index a and b for every
+# frame in the background, and sets the preview group to the count frames
+# that differ the most. metric is either "psnr" or "mae". Cancelled by
+# vsqv.Cancel().
+def ScanDifferences(clip: Optional[vs.VideoNode]=None, a: int=0, b: int=1, metric: str="psnr", count: int=50) -> None:
+    global LastScan
+    global ScanGeneration
+
+    assert(type(a) == int and 0 <= a < 10 and Sources[a])
+    assert(type(b) == int and 0 <= b < 10 and Sources[b])
+    assert(metric in DifferenceMetrics)
+    assert(type(count) == int and count > 0)
+    if isinstance(Sources[a], RemoteClip) or isinstance(Sources[b], RemoteClip):
+        raise TypeError("vsqv.ScanDifferences() doesn't support clips previewed with vsqv.ViewScript().")
+
+    BackgroundLock.lock()
+    ScanGeneration += 1
+    scan_generation = ScanGeneration
+    background_generation = BackgroundGeneration
+    BackgroundLock.unlock()
+    dropStaleAsyncRequests()
+
+    LastScan = ScanDifferencesProgress(a, b, metric, count, differenceClip(Sources[a], Sources[b], metric),
+                                       (Sources[a], Sources[b]), background_generation, scan_generation)
+    backend.status = f"Scanning differences 0/{LastScan.total}"
+    LastScan.request_more()
+# Returns the scores of every frame from the last vsqv.ScanDifferences(),
+# with NaN for frames not scanned, or None if nothing has been scanned.
+def DifferenceScores(clip: Optional[vs.VideoNode]=None) -> Optional[np.ndarray]:
+    if LastScan is None:
+        return None
+    return LastScan.scores.copy()
+LastScan = None
 def PreviewGroup(clip: Optional[vs.VideoNode]=None) -> list[int]:
     return list(backend.preview_group)
 
 def Show(clip: Optional[vs.VideoNode]=None) -> None:
+    startEngine()
     window_control.show.emit()
 def Hide(clip: Optional[vs.VideoNode]=None) -> None:
     window_control.hide.emit()
+
+def Cancel(clip: Optional[vs.VideoNode]=None) -> None:
+    global BackgroundGeneration
+
+    BackgroundLock.lock()
+    BackgroundGeneration += 1
+    BackgroundLock.unlock()
+
+    dropStaleAsyncRequests()
+    backend.status = ""
+
+# Upper bounds of the histogram buckets in milliseconds, with the last
+# bucket counting everything above
+HistogramBins = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+def summarizeTimes(times):
+    times = np.array(times, dtype=np.float64) * 1000
+    if times.size:
+        return { "count": int(times.size),
+                 "mean_ms": float(np.mean(times)),
+                 "p50_ms": float(np.percentile(times, 50)),
+                 "p90_ms": float(np.percentile(times, 90)),
+                 "p99_ms": float(np.percentile(times, 99)),
+                 "max_ms": float(np.max(times)),
+                 "histogram": np.bincount(np.searchsorted(HistogramBins, times), minlength=len(HistogramBins) + 1).tolist() }
+    else:
+        return { "count": 0 }
+
+def Stats(clip: Optional[vs.VideoNode]=None) -> dict:
+    slots = {}
+    for index in range(10):
+        if Clips[index] or any(StageTimes[index].values()):
+            slots[index] = { "name": Names[index],
+                             "depth": DepthPolicies[index],
+                             "cache_hits": DisplayCacheCounts[index]["hits"],
+                             "cache_misses": DisplayCacheCounts[index]["misses"] }
+            for stage in Stages:
+                slots[index][stage] = summarizeTimes(StageTimes[index][stage])
+
+    return { "load_image": summarizeTimes(LoadImageTimes),
+             "display_latency": summarizeTimes(DisplayLatencies),
+             "histogram_bins_ms": HistogramBins,
+             "slots": slots,
+             "cache": Cache.stats(),
+             "disk_cache": FrameDiskCache.stats() if FrameDiskCache is not None else None,
+             "startup_ms": { phase: seconds * 1000 for phase, seconds in StartupTimes.items() } }
@@ -56,42 +56,110 @@ ApplicationWindow {
     property int image_number: 0
     Connections {
         target: backend
-        function onImageReady() {
+        function onImageReady(level, x, y, fullWidth, fullHeight) {
+            picture.level = level
+            picture.offsetX = x
+            picture.offsetY = y
+            image.fullWidth = fullWidth
+            image.fullHeight = fullHeight
             image_number++
-            image.source = "image://backend/" + image_number
+            picture.source = "image://backend/" + image_number
         }
     }
     
-    Image {
+    // The whole frame, of which picture may only cover the visible tiles
+    Item {
         id: image
         anchors.centerIn: parent
         anchors.horizontalCenterOffset: 0
         anchors.verticalCenterOffset: 0
 
+        // Below 1, scale is always 1 / n with n up to 8
         property real scale: 1
-        width: {
-            if(backend.devicePixelRatioOverride > 0.0) {
-                sourceSize.width * scale / backend.devicePixelRatioOverride
-            }
-            else {
-                sourceSize.width * scale / Screen.devicePixelRatio
-            }
+        onScaleChanged: {
+            backend.level = scale < 1 ? Math.round(1 / scale) : 1
         }
-        height: {
-            if(backend.devicePixelRatioOverride > 0.0) {
-                sourceSize.height * scale / backend.devicePixelRatioOverride
-            }
-            else {
-                sourceSize.height * scale / Screen.devicePixelRatio
-            }
+        // The size of the whole frame in backend
+        property int fullWidth: 1920
+        property int fullHeight: 1080
+        width: fullWidth * scale / devicePixelRatio()
+        height: fullHeight * scale / devicePixelRatio()
+
+        onXChanged: updateViewport()
+        onYChanged: updateViewport()
+        onWidthChanged: updateViewport()
+        onHeightChanged: updateViewport()
+
+        Image {
+            id: picture
+
+            // The factor the current image is downscaled by in backend
+            property int level: 1
+            // The offset of the current image in the whole frame
+            property int offsetX: 0
+            property int offsetY: 0
+            x: offsetX * image.scale / devicePixelRatio()
+            y: offsetY * image.scale / devicePixelRatio()
+            width: sourceSize.width * level * image.scale / devicePixelRatio()
+            height: sourceSize.height * level * image.scale / devicePixelRatio()
+            source: "image://backend/" + image_number
+            asynchronous: false
+            smooth: level * image.scale < 1
+            cache: false
+        }
+    }
+
+    // Tells backend which part of the frame is visible so that only the
+    // visible tiles are loaded at high zoom levels
+    function updateViewport() {
+        let ratio = devicePixelRatio() / image.scale
+        backend.setViewport(Math.floor(-image.x * ratio), Math.floor(-image.y * ratio),
+                            Math.ceil(window.width * ratio), Math.ceil(window.height * ratio),
+                            image.scale)
+    }
+    onWidthChanged: updateViewport()
+    onHeightChanged: updateViewport()
+
+    function devicePixelRatio() {
+        if(backend.devicePixelRatioOverride > 0.0) {
+            return backend.devicePixelRatioOverride
+        }
+        else {
+            return Screen.devicePixelRatio
+        }
+    }
+    function zoomIn(scale) {
+        if(scale < 1) {
+            return 1 / (Math.round(1 / scale) - 1)
+        }
+        else if(scale < 12) {
+            return scale + 1
+        }
+        else {
+            return scale
+        }
+    }
+    function zoomOut(scale) {
+        if(scale > 1) {
+            return scale - 1
+        }
+        else if(Math.round(1 / scale) < 8) {
+            return 1 / (Math.round(1 / scale) + 1)
         }
-        source: "image://backend/" + image_number
-        asynchronous: false
-        smooth: false
-        cache: false
+        else {
+            return scale
+        }
+    }
+    function zoomToFit() {
+        let n = Math.ceil(Math.max(image.fullWidth / (window.width * devicePixelRatio()),
+                                   image.fullHeight / (window.height * devicePixelRatio())))
+        image.scale = n > 1 ? 1 / Math.min(n, 8) : 1
+        image.anchors.horizontalCenterOffset = 0
+        image.anchors.verticalCenterOffset = 0
     }
 
     property bool showLabelText: false
+    property bool showStatsText: false
     property string extraLabelText: ""
     function updateLabelText() {
         if(backend.message != "") {
@@ -101,7 +169,10 @@ ApplicationWindow {
             label.text = extraLabelText
         }
         else if(showLabelText) {
-            label.text = "Index " + backend.index.toString() + (backend.name ? ": " + backend.name : "") + " / Frame " + backend.frame.toString() + (backend.frameInPreviewGroup() ? " (Preview Group)" : "")
+            label.text = "Index " + backend.index.toString() + (backend.name ? ": " + backend.name : "") + " / Frame " + backend.frame.toString() + (backend.frameInPreviewGroup() ? " (Preview Group)" : "") + (backend.status ? " / " + backend.status : "") + (backend.playbackText ? " / " + backend.playbackText : "")
+        }
+        else if(backend.status || backend.playbackText) {
+            label.text = [backend.status, backend.playbackText].filter(Boolean).join(" / ")
         }
         else {
             label.text = ""
@@ -147,6 +218,18 @@ ApplicationWindow {
             updateLabelText()
         }
     }
+    Connections {
+        target: backend
+        function onStatusChanged() {
+            updateLabelText()
+        }
+    }
+    Connections {
+        target: backend
+        function onPlaybackTextChanged() {
+            updateLabelText()
+        }
+    }
 
     Label {
         id: label
@@ -154,7 +237,7 @@ ApplicationWindow {
         color: "#B0FFFFFF"
         antialiasing: true
         anchors.bottom: parent.bottom
-        anchors.bottomMargin: 43.2
+        anchors.bottomMargin: showTimeline ? timeline.height + 24 : 43.2
         anchors.left: parent.left
         anchors.leftMargin: 68.8
 
@@ -172,6 +255,120 @@ ApplicationWindow {
             color: "#40000000"
         }
     }
+
+    // Timings of the last displayed frame, toggled with I
+    Label {
+        id: statsLabel
+        font.pixelSize: 20
+        color: "#B0FFFFFF"
+        antialiasing: true
+        anchors.bottom: label.top
+        anchors.bottomMargin: 8
+        anchors.left: parent.left
+        anchors.leftMargin: 68.8
+
+        text: backend.statsText
+        visible: showStatsText && text
+
+        background: Rectangle {
+            color: "#40000000"
+        }
+    }
+
+    // Thumbnails of the current clip across its length, toggled with T.
+    // Hovering shows the thumbnail nearest to the frame under the mouse,
+    // and clicking goes to the frame.
+    property bool showTimeline: false
+    Item {
+        id: timeline
+        z: 101
+        height: 64
+        anchors.left: parent.left
+        anchors.right: parent.right
+        anchors.bottom: parent.bottom
+        visible: showTimeline && backend.frameCount > 0
+
+        // Thumbnails are only loaded once the timeline is shown
+        onVisibleChanged: {
+            if(visible) {
+                backend.loadThumbnails()
+            }
+        }
+        Connections {
+            target: backend
+            function onIndexChanged() {
+                if(timeline.visible) {
+                    backend.loadThumbnails()
+                }
+            }
+        }
+
+        function frameAt(x) {
+            return Math.max(0, Math.min(backend.frameCount - 1, Math.floor(x / width * backend.frameCount)))
+        }
+        function thumbnail(frame) {
+            return "image://thumbnails/" + backend.index + "/" + frame + "/" + backend.thumbnailsVersion
+        }
+
+        Rectangle {
+            anchors.fill: parent
+            color: "#80000000"
+        }
+        Row {
+            anchors.fill: parent
+            Repeater {
+                model: timeline.visible ? Math.ceil(timeline.width / (timeline.height * 16 / 9)) : 0
+                Image {
+                    width: timeline.height * 16 / 9
+                    height: timeline.height
+                    fillMode: Image.PreserveAspectCrop
+                    asynchronous: true
+                    cache: false
+                    source: timeline.thumbnail(timeline.frameAt((index + 0.5) * width))
+                }
+            }
+        }
+        Rectangle {
+            width: 2
+            height: parent.height
+            x: backend.frame / Math.max(backend.frameCount, 1) * parent.width - 1
+            color: "#FFFFFFFF"
+        }
+
+        MouseArea {
+            id: timelineMouseArea
+            anchors.fill: parent
+            hoverEnabled: true
+            acceptedButtons: Qt.LeftButton
+            onClicked: (mouse) => {
+                backend.switchFrame(timeline.frameAt(mouse.x))
+            }
+        }
+
+        Image {
+            id: timelinePreview
+            visible: timelineMouseArea.containsMouse
+            height: timeline.height * 3
+            width: height * 16 / 9
+            fillMode: Image.PreserveAspectFit
+            asynchronous: true
+            cache: false
+            x: Math.max(0, Math.min(timeline.width - width, timelineMouseArea.mouseX - width / 2))
+            anchors.bottom: parent.top
+            source: visible ? timeline.thumbnail(timeline.frameAt(timelineMouseArea.mouseX)) : ""
+
+            Label {
+                anchors.bottom: parent.bottom
+                anchors.horizontalCenter: parent.horizontalCenter
+                font.pixelSize: 20
+                color: "#B0FFFFFF"
+                text: timeline.frameAt(timelineMouseArea.mouseX)
+                background: Rectangle {
+                    color: "#40000000"
+                }
+            }
+        }
+    }
     
     MouseArea {
         id: mousearea
@@ -242,14 +439,10 @@ ApplicationWindow {
             let scale = image.scale
 
             if(wheel.angleDelta.y > 0) {
-                if(scale < 12) {
-                    image.scale = scale + 1
-                }
+                image.scale = zoomIn(scale)
             }
             else if(wheel.angleDelta.y < 0) {
-                if(scale > 1) {
-                    image.scale = scale - 1
-                }
+                image.scale = zoomOut(scale)
             }
 
             if(mouseX > image_x && mouseX < image_x + image_width &&
@@ -290,6 +483,10 @@ ApplicationWindow {
                 window.close()
             }
 
+            else if(event.key === Qt.Key_W) {
+                zoomToFit()
+            }
+
             else if(event.key === Qt.Key_Space) {
                 if(!(event.modifiers & Qt.ShiftModifier)) {
                     backend.cycleIndex()
@@ -472,6 +669,18 @@ ApplicationWindow {
                 backend.saveImage()
             }
 
+            else if(event.key === Qt.Key_T) {
+                showTimeline = !showTimeline
+            }
+
+            else if(event.key === Qt.Key_P) {
+                backend.togglePlayback()
+            }
+
+            else if(event.key === Qt.Key_I) {
+                showStatsText = !showStatsText
+            }
+
             else {
                 event.accepted = false
             }
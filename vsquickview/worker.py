@@ -0,0 +1,267 @@
+# vsquickview
+# Copyright (c) Akatsumekusa and contributors
+
+# ---------------------------------------------------------------------
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# ---------------------------------------------------------------------
+
+
+# The render worker of vsqv.ViewScript(). It's started by RenderWorker in
+# remote.py as a separate Python process running this file as a script,
+# so that it imports neither vsquickview nor Qt. It runs a VapourSynth
+# script, converts its output the same way vsquickview does, and renders
+# frames on request, passing the pixels back through shared memory.
+#
+# The worker reads the authkey from stdin, prints the address it listens
+# on to stdout, and accepts a single connection. Requests and replies are
+# tuples beginning with their type and, except for "script", an id:
+#     ("script", path, output)             -> ("ready", info, segment_names)
+#     ("transform", id, matrix, luts)      -> nothing
+#     ("clip", id, spec)                   -> ("clip", id, info)
+#     ("frame", id, clip_id, n)            -> ("frame", id, slot, name, shape, dtype, format)
+#     ("release", slot)                    -> nothing
+# Any request may be answered with ("error", id, message) instead. Every
+# "frame" reply must be answered with a "release" of its slot once the
+# pixels are copied out of the shared memory.
+
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener
+import numpy as np
+import os
+import runpy
+import signal
+import sys
+import threading
+import traceback
+import vapoursynth as vs
+
+from convert import convertClip, convertTile, transformClip
+
+# A ColorTransform from the main process with its LUTs already calculated
+class LutColorTransform:
+    def __init__(self, matrix, luts):
+        self.matrix = matrix
+        self._luts = luts
+
+    def luts(self, bits):
+        return self._luts[bits]
+
+def clipInfo(clip):
+    return { "width": clip.width,
+             "height": clip.height,
+             "num_frames": clip.num_frames,
+             "fps_num": clip.fps_num,
+             "fps_den": clip.fps_den,
+             "format": { "name": clip.format.name,
+                         "color_family": int(clip.format.color_family),
+                         "sample_type": int(clip.format.sample_type),
+                         "bits_per_sample": clip.format.bits_per_sample,
+                         "num_planes": clip.format.num_planes,
+                         "subsampling_w": clip.format.subsampling_w,
+                         "subsampling_h": clip.format.subsampling_h } }
+
+# A fixed set of named shared memory segments that frames are packed into,
+# so that no segment is left behind whatever happens to a reply. A slot is
+# acquired for every frame and released when the main process is done
+# with it, and its segment is replaced by a larger one when needed. The
+# segments are unlinked in close(), or by the resource tracker if the
+# worker is killed.
+class SegmentPool:
+    Count = 16
+
+    def __init__(self):
+        self.names = ["vsqv_" + str(os.getpid()) + "_" + str(slot) for slot in range(SegmentPool.Count)]
+        self.segments = [None] * SegmentPool.Count
+        self.free = list(range(SegmentPool.Count))
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            while not self.free and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                raise RuntimeError("vsquickview render worker is exiting.")
+            slot = self.free.pop()
+            try:
+                if self.segments[slot] is None or self.segments[slot].size < size:
+                    self.unlink(slot)
+                    try:
+                        self.segments[slot] = shared_memory.SharedMemory(name=self.names[slot], create=True, size=size)
+                    except FileExistsError:
+                        # Left behind by a killed worker with the same pid
+                        self.segments[slot] = shared_memory.SharedMemory(name=self.names[slot])
+                        self.unlink(slot)
+                        self.segments[slot] = shared_memory.SharedMemory(name=self.names[slot], create=True, size=size)
+            except:
+                self.free.append(slot)
+                raise
+            return slot, self.segments[slot]
+
+    def release(self, slot):
+        with self.condition:
+            self.free.append(slot)
+            self.condition.notify()
+
+    # Must be called with self.condition locked
+    def unlink(self, slot):
+        if (shm := self.segments[slot]) is not None:
+            self.segments[slot] = None
+            try:
+                shm.close()
+            except BufferError:
+                pass
+            shm.unlink()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            for slot in range(SegmentPool.Count):
+                try:
+                    self.unlink(slot)
+                except OSError:
+                    pass
+
+# Packs a frame converted by convertClip() into the interleaved layout of
+# packImage() in vsquickview.py, directly into a slot of segments,
+# returning the slot
+def packFrame(frame, segments):
+    if frame.format.color_family == vs.RGB:
+        if frame.format.bits_per_sample == 16:
+            shape, dtype, format = (frame.height, frame.width, 4), np.uint16, "RGBX64"
+        else:
+            shape, dtype, format = (frame.height, frame.width, 3), np.uint8, "RGB888"
+    else:
+        if frame.format.bits_per_sample == 16:
+            shape, dtype, format = (frame.height, frame.width), np.uint16, "Grayscale16"
+        else:
+            shape, dtype, format = (frame.height, frame.width), np.uint8, "Grayscale8"
+
+    slot, shm = segments.acquire(max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1))
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        if frame.format.color_family == vs.RGB:
+            for plane in range(3):
+                image[:, :, plane] = np.asarray(frame[plane])
+            if format == "RGBX64":
+                image[:, :, 3] = np.iinfo(np.uint16).max
+        else:
+            image[:, :] = np.asarray(frame[0])
+        del image
+    except:
+        segments.release(slot)
+        raise
+
+    return slot, segments.names[slot], shape, np.dtype(dtype).str, format
+
+class Worker:
+    def __init__(self, connection):
+        self.connection = connection
+        self.send_lock = threading.Lock()
+        self.source = None
+        # { id: vs.VideoNode }, with the output of the script under None
+        self.clips = {}
+        # { id: LutColorTransform }
+        self.transforms = {}
+        self.segments = SegmentPool()
+
+    def send(self, message):
+        with self.send_lock:
+            self.connection.send(message)
+
+    def run(self):
+        try:
+            self.serve()
+        finally:
+            self.segments.close()
+
+    def serve(self):
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                if message[0] == "script":
+                    runpy.run_path(message[1], run_name="__vapoursynth__")
+                    self.source = vs.get_output(message[2])
+                    # vs.VideoOutputTuple since R58
+                    self.source = getattr(self.source, "clip", self.source)
+                    self.clips[None] = self.source
+                    self.send(("ready", clipInfo(self.source), self.segments.names))
+                elif message[0] == "transform":
+                    self.transforms[message[1]] = LutColorTransform(message[2], message[3])
+                elif message[0] == "clip":
+                    self.clips[message[1]] = self.clip(message[2])
+                    self.send(("clip", message[1], clipInfo(self.clips[message[1]])))
+                elif message[0] == "frame":
+                    future = self.clips[message[2]].get_frame_async(message[3])
+                    future.add_done_callback(lambda future, id=message[1]: self.onFrame(id, future))
+                elif message[0] == "release":
+                    self.segments.release(message[1])
+            except Exception:
+                self.send(("error", message[1] if message[0] != "script" else None, traceback.format_exc()))
+
+    # spec is None for the output of the script, or (depth, level, tile,
+    # conversion, transform_id)
+    def clip(self, spec):
+        if spec is None:
+            return self.source
+
+        depth, level, tile, conversion, transform_id = spec
+        if tile is None:
+            clip = convertClip(self.source, depth, level, conversion)
+        else:
+            clip = convertTile(self.source, depth, tile, conversion)
+        return transformClip(clip, self.transforms[transform_id] if transform_id is not None else None)
+
+    def onFrame(self, id, future):
+        try:
+            packed = packFrame(future.result(), self.segments)
+            try:
+                self.send(("frame", id, *packed))
+            except:
+                self.segments.release(packed[0])
+                raise
+        except Exception:
+            try:
+                self.send(("error", id, traceback.format_exc()))
+            except OSError:
+                pass
+
+def main():
+    # RenderWorker.close() terminates the worker, which should still clean
+    # up its shared memory
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    with Listener(authkey=authkey) as listener:
+        print(repr(listener.address), flush=True)
+        # Anything the script prints goes to stderr instead of the pipe
+        # nobody reads any more
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        connection = listener.accept()
+    Worker(connection).run()
+
+if __name__ == "__main__":
+    main()